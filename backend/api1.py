@@ -1,17 +1,35 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import datetime
 import os
+import csv
+import io
+import json
+from decimal import Decimal
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
 import re
 import jwt
 from functools import wraps
 import bcrypt
-from price_predictor import price_predictor
+from lazy import LazyAttribute
+from db import get_db_connection, get_read_connection, primary_breaker
+from cache import TTLCache
+from suggest_index import title_index
+from dedup import near_duplicate_index
+from similar_index import similar_index
+from price_history import fetch_history, parse_range
+from feature_store import predict_products, fetch_features
+from inference_batcher import BatchingPredictor
+from prediction_queue import (
+    ASYNC_PREDICTIONS, PRICE_STATUS_PENDING, PRICE_STATUS_PREDICTED,
+    enqueue_prediction, cancel_predictions, cancel_matching_predictions,
+    ensure_workers as ensure_prediction_workers
+)
+from responses import init_app as init_responses, parse_fields, conditional_response
+from rate_limit import init_app as init_rate_limits
+from db_guard import init_app as init_db_guard
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +41,7 @@ CORS(app,
      resources={
          r"/*": {
              "origins": ["http://localhost:3000"],
-             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+             "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
              "allow_headers": ["Content-Type", "Authorization"],
              "supports_credentials": True,
              "expose_headers": ["Content-Type", "Authorization"]
@@ -32,49 +50,73 @@ CORS(app,
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            database=os.getenv('DB_NAME', 'data'),
-            user=os.getenv('DB_USER', 'postgres'),
-            password=os.getenv('DB_PASSWORD', 'Anasanas.1'),
-            port=os.getenv('DB_PORT', '5432')
-        )
-        return conn
-    except Exception as e:
-        print("Database connection error:", str(e))
-        return None
+# orjson serialization and gzip/br compression for every response
+init_responses(app)
 
-def initialize_database():
-    """Initialize the database with required tables"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor() as cur:
-                # Create users table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        email VARCHAR(255) UNIQUE NOT NULL,
-                        password VARCHAR(255) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                conn.commit()
-                print("Database initialized successfully")
-    except Exception as e:
-        print("Database initialization error:", str(e))
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+# Token-bucket rate limits and concurrency caps for expensive routes
+init_rate_limits(app)
+
+# 503 (or stale product reads) while the database circuit breaker is open
+init_db_guard(app)
+
+# Loaded on first prediction; importing pandas / scikit-learn and the model
+# at import time would slow every worker boot (see bench_startup.py)
+price_predictor = LazyAttribute('price_predictor', 'price_predictor')
+
+# Coalesces concurrent synchronous predictions into one model call
+batched_predictor = BatchingPredictor(price_predictor)
+
+# Routes that run the model. The first request to one of them loads it in
+# the background; until then create_product queues its prediction. Other
+# requests never import pandas / scikit-learn.
+PREDICTION_ENDPOINTS = {'create_product', 'export_products'}
+
+@app.before_request
+def warm_predictor():
+    if request.endpoint in PREDICTION_ENDPOINTS:
+        batched_predictor.warm()
+
+# Queue predictions instead of running the model inside create_product;
+# otherwise the workers start with the first ?async=true job
+if ASYNC_PREDICTIONS:
+    ensure_prediction_workers()
 
-# Initialize database when the app starts
-initialize_database()
+# Product reads go to replicas (DB_REPLICA_HOSTS) except right after a write
+READ_YOUR_WRITES_COOKIE = 'read_primary'
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+NEAR_DUPLICATE_MODES = ('warn', 'reject', 'return', 'merge', 'allow')
+
+# Default columns for listings; override with ?fields=
+LIST_FIELDS = ['id', 'title', 'description', 'price']
+SEARCH_FIELDS = ['id', 'title', 'description']
+
+# Competitor price deltas; the expressions match the indexes in migrations.py
+COMPETITOR_DELTAS = {
+    'tunisianet': '(price - price_tunisianet)',
+    'mytech': '(price - price_mytech)'
+}
+SORT_KEYS = {
+    'id': 'id',
+    'price': 'price',
+    'title': 'title',
+    'category': 'category',
+    'delta_tunisianet': COMPETITOR_DELTAS['tunisianet'],
+    'delta_mytech': COMPETITOR_DELTAS['mytech']
+}
+# Keys that can be NULL; sorted NULLS LAST both ways on the migration 11
+# indexes. id and title are NOT NULL and use the primary / unique key.
+NULLABLE_SORT_KEYS = {'price', 'category', 'delta_tunisianet', 'delta_mytech'}
+FILTER_ARGS = [
+    'min_price', 'max_price',
+    'min_delta_tunisianet', 'max_delta_tunisianet',
+    'min_delta_mytech', 'max_delta_mytech'
+]
+# Optional model inputs accepted by POST /products (same unit as price)
+MODEL_INPUT_FIELDS = ['historical_price', 'price_tunisianet', 'price_mytech', 'historical_discount']
+
+# Category facet counts, keyed by the non-category filters
+facet_cache = TTLCache(ttl=int(os.getenv('FACET_CACHE_TTL', '60')))
 
 @app.route('/auth/register', methods=['POST'])
 def register():
@@ -166,12 +208,29 @@ def register():
     except Exception as e:
         print("Registration error:", str(e))
         return jsonify({"error": str(e)}), 500
+def get_product_read_connection():
+    """Replica connection for product reads.
+
+    Clients that wrote within READ_YOUR_WRITES_SECONDS carry the
+    read-your-writes cookie and stay on the primary so they see their
+    own changes despite replication lag.
+    """
+    if request.cookies.get(READ_YOUR_WRITES_COOKIE):
+        conn = get_db_connection()
+        if conn:
+            return conn
+        # Primary down: a possibly stale replica beats failing the read
+    return get_read_connection()
+
 @app.after_request
 def after_request(response):
+    if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE')
+            and request.path.startswith('/products') and response.status_code < 400):
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, '1', max_age=READ_YOUR_WRITES_SECONDS, httponly=True)
     response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,PATCH,POST,DELETE,OPTIONS')
     return response
 
 # Special handler for OPTIONS requests
@@ -261,7 +320,15 @@ def api_info():
         "POST /products": "Create new product",
         "PUT /products/<id>": "Update product",
         "DELETE /products/<id>": "Delete product",
-        "GET /products/search": "Search products"
+        "GET /products/search": "Search products",
+        "GET /products/suggest": "Title autocomplete (prefix of any word)",
+        "PATCH /products/bulk": "Update many products by ids or filter",
+        "DELETE /products/bulk": "Delete many products by ids or filter",
+        "GET /products/export": "Stream the catalog with recommended prices (CSV or NDJSON)",
+        "GET /products/<id>/prediction": "Price prediction status (pending or predicted)",
+        "GET /products/<id>/history": "Price history, raw or downsampled (?bucket=day)",
+        "GET /products/<id>/similar": "Comparable products by text, price and category",
+        "GET /metrics/rate-limits": "Rate limiting and load shedding counters"
     }
     return jsonify({
         "message": "Product API Service",
@@ -284,7 +351,8 @@ def health_check():
             "database": db_status,
             "server_time": datetime.datetime.now().isoformat(),
             "python_version": os.sys.version,
-            "platform": os.sys.platform
+            "platform": os.sys.platform,
+            "circuit_breaker": primary_breaker.snapshot()
         }
         
         if conn:
@@ -313,44 +381,85 @@ def health_check():
 # 3. GET ALL PRODUCTS (PAGINATED)
 @app.route('/products', methods=['GET'])
 def get_products():
-    """Get all products with pagination"""
+    """Get all products with pagination, filters, sorting and facets
+
+    Filters: category, min_price, max_price, min_/max_delta_tunisianet,
+    min_/max_delta_mytech. Sort with sort=<key> or sort=-<key> (descending);
+    products without a value for the key come last.
+    facets=category adds per-category counts for the other filters.
+    """
     try:
         page = request.args.get('page', default=1, type=int)
         per_page = request.args.get('per_page', default=10, type=int)
         
         if page < 1 or per_page < 1:
             return jsonify({"error": "Page and per_page must be positive integers"}), 400
+
+        try:
+            fields = parse_fields(LIST_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        sort = request.args.get('sort', '-id')
+        sort_key = sort.lstrip('-')
+        if sort_key not in SORT_KEYS:
+            return jsonify({"error": f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400
+        direction = 'DESC' if sort.startswith('-') else 'ASC'
+        # Products without a value come last either way; each direction has
+        # its own (key, id) index (migration 11), so no sort is needed
+        nulls = ' NULLS LAST' if sort_key in NULLABLE_SORT_KEYS and direction == 'DESC' else ''
+        order_by = f"{SORT_KEYS[sort_key]} {direction}{nulls}, id {direction}"
+
+        filters = {}
+        for arg in FILTER_ARGS:
+            value = request.args.get(arg)
+            if value is not None:
+                try:
+                    filters[arg] = float(value)
+                except ValueError:
+                    return jsonify({"error": f"{arg} must be a number"}), 400
+        facet_filters = dict(filters)
+        if request.args.get('category'):
+            filters['category'] = request.args['category']
+        where_sql, where_params = build_product_filter(filters)
+        with_facets = request.args.get('facets') == 'category'
         
-        conn = get_db_connection()
+        conn = get_product_read_connection()
         if not conn:
             return jsonify({"error": "Database connection failed"}), 500
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 # Get total count
-                cur.execute("""
+                cur.execute(f"""
                     SELECT COUNT(*) 
                     FROM scraped_data 
-                """)
+                    {where_sql}
+                """, where_params)
                 total = cur.fetchone()['count']
                 
                 # Get paginated products
                 offset = (page - 1) * per_page
-                cur.execute("""
-                    SELECT id, title, description, price 
+                cur.execute(f"""
+                    SELECT {', '.join(fields)}
                     FROM scraped_data 
-                    ORDER BY id DESC 
+                    {where_sql}
+                    ORDER BY {order_by}
                     LIMIT %s OFFSET %s
-                """, (per_page, offset))
+                """, where_params + [per_page, offset])
                 products = cur.fetchall()
-                
-                return jsonify({
+
+                result = {
                     "page": page,
                     "per_page": per_page,
                     "total_items": total,
                     "total_pages": (total + per_page - 1) // per_page,
                     "products": products
-                })
+                }
+                if with_facets:
+                    result["facets"] = {"category": get_category_facets(cur, facet_filters)}
+                
+                return conditional_response(jsonify(result))
         except Exception as e:
             return jsonify({"error": f"Database error: {str(e)}"}), 500
         finally:
@@ -359,24 +468,46 @@ def get_products():
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+def get_category_facets(cur, filters):
+    """Per-category product counts under `filters`, cached for FACET_CACHE_TTL"""
+    cache_key = tuple(sorted(filters.items()))
+    facets = facet_cache.get(cache_key)
+    if facets is None:
+        where_sql, where_params = build_product_filter(filters)
+        cur.execute(f"""
+            SELECT category, COUNT(*) AS count
+            FROM scraped_data
+            {where_sql}
+            GROUP BY category
+            ORDER BY count DESC
+        """, where_params)
+        facets = [{"category": row['category'], "count": row['count']} for row in cur.fetchall()]
+        facet_cache.set(cache_key, facets)
+    return facets
+
 # 4. GET SINGLE PRODUCT
 @app.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     """Get single product by ID"""
-    conn = get_db_connection()
+    try:
+        fields = parse_fields(LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_product_read_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, title, description, price 
+            cur.execute(f"""
+                SELECT {', '.join(fields)}
                 FROM scraped_data 
                 WHERE id = %s
             """, (product_id,))
             product = cur.fetchone()
             if product:
-                return jsonify(product)
+                return conditional_response(jsonify(product))
             return jsonify({"error": "Product not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -384,10 +515,73 @@ def get_product(product_id):
         if conn:
             conn.close()
 
+def resolve_near_duplicate(product_id, description, category, merge=False):
+    """Return the existing near-duplicate, optionally filling in its gaps.
+
+    Merging only fills a missing description or category; the stored
+    title and price win.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if merge:
+                cur.execute("""
+                    UPDATE scraped_data
+                    SET description = CASE
+                            WHEN COALESCE(description, '') IN ('', 'Description not found') AND %s <> ''
+                            THEN %s ELSE description END,
+                        category = COALESCE(category, %s)
+                    WHERE id = %s
+                    RETURNING id, title, description, price, category
+                """, (description, description, category, product_id))
+            else:
+                cur.execute("""
+                    SELECT id, title, description, price, category
+                    FROM scraped_data
+                    WHERE id = %s
+                """, (product_id,))
+            product = cur.fetchone()
+            conn.commit()
+            if not product:
+                # Index was stale; the match has been deleted since
+                near_duplicate_index.remove(product_id)
+                return jsonify({"error": "Near-duplicate match no longer exists, retry"}), 409
+            if merge:
+                similar_index.add(product_id, product)
+
+            return jsonify({
+                "message": "Merged into existing product" if merge else "Existing near-duplicate product returned",
+                "product": product
+            }), 200
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
 # 5. CREATE PRODUCT
 @app.route('/products', methods=['POST'])
 def create_product():
-    """Create new product with price prediction"""
+    """Create new product with price prediction
+
+    The price is predicted from the product_features row written by the
+    insert trigger, so the model sees the competitor and historical prices
+    given in the body (historical_price, price_tunisianet, price_mytech,
+    historical_discount) or, where missing, the input price.
+
+    With ASYNC_PREDICTIONS (or ?async=true) the product is stored with its
+    input price and a prediction job is queued; poll
+    GET /products/<id>/prediction for the result. The same happens while
+    the model is still loading, so the insert never waits for it.
+
+    Near-duplicate titles are handled per ?on_duplicate=: warn (create it
+    and list the matches in near_duplicates, default), reject (409 with the
+    matches), return (the existing product), merge (fill the existing
+    product's missing fields) or allow.
+    """
     try:
         data = request.get_json()
         
@@ -401,19 +595,38 @@ def create_product():
         
         if not title:
             return jsonify({"error": "Title is required"}), 400
+        if input_price is not None and not isinstance(input_price, (int, float)):
+            return jsonify({"error": "Price must be a number"}), 400
+        model_inputs = {}
+        for field in MODEL_INPUT_FIELDS:
+            if data.get(field) is not None:
+                if not isinstance(data[field], (int, float)):
+                    return jsonify({"error": f"{field} must be a number"}), 400
+                model_inputs[field] = data[field]
 
-        # Get predicted price using input price
-        predicted_price = price_predictor.predict_price(
-            title=title,
-            description=description,
-            category=category,
-            input_price=input_price
-        )
-        
-        if predicted_price is None:
-            # If prediction fails, use input price or default
-            predicted_price = input_price if input_price is not None else 1000.0
-            print("Using input price or default due to prediction failure")
+        on_duplicate = request.args.get('on_duplicate', 'warn')
+        if on_duplicate not in NEAR_DUPLICATE_MODES:
+            return jsonify({"error": f"on_duplicate must be one of: {', '.join(NEAR_DUPLICATE_MODES)}"}), 400
+
+        # Near-duplicate check through the LSH index; skipped (not blocked)
+        # while the index is still being built
+        matches = []
+        if on_duplicate != 'allow' and near_duplicate_index.warm(get_read_connection):
+            matches = near_duplicate_index.find(title)
+        if matches and on_duplicate == 'reject':
+            return jsonify({
+                "error": "A near-duplicate product already exists",
+                "matches": matches[:5]
+            }), 409
+        if matches and on_duplicate in ('return', 'merge'):
+            return resolve_near_duplicate(matches[0]['id'], description, category, merge=on_duplicate == 'merge')
+
+        async_prediction = request.args.get('async', str(ASYNC_PREDICTIONS)).lower() in ('1', 'true', 'yes')
+        # Never hold the transaction open while the model loads
+        async_prediction = async_prediction or not batched_predictor.ready()
+        price_status = PRICE_STATUS_PENDING if async_prediction else PRICE_STATUS_PREDICTED
+        # Stored until the prediction replaces it
+        base_price = input_price if input_price is not None else 1000.0
 
         conn = get_db_connection()
         if not conn:
@@ -431,30 +644,64 @@ def create_product():
                     return jsonify({"error": "Product with this title already exists"}), 400
 
                 # Insert new product
-                cur.execute("""
-                    INSERT INTO scraped_data (title, description, price, category)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id, title, description, price, category
+                columns = ['title', 'description', 'price', 'category', 'price_status', *model_inputs]
+                cur.execute(f"""
+                    INSERT INTO scraped_data ({', '.join(columns)})
+                    VALUES ({', '.join(['%s'] * len(columns))})
+                    RETURNING id, title, description, price, category, price_status
                 """, (
                     title,
                     description,
-                    predicted_price,
-                    category
+                    base_price,
+                    category,
+                    price_status,
+                    *model_inputs.values()
                 ))
                 
                 new_product = cur.fetchone()
+                if async_prediction:
+                    enqueue_prediction(cur, new_product['id'], category, input_price)
+                else:
+                    # Score the features row the insert trigger just wrote;
+                    # concurrent requests share one model call through the batcher
+                    features = fetch_features(cur, [new_product['id']]).get(new_product['id'])
+                    try:
+                        predicted_price = batched_predictor.predict(features) if features else None
+                    except Exception as e:
+                        print("Prediction error:", str(e))
+                        predicted_price = None
+                    if predicted_price is None:
+                        # If prediction fails, keep the input price or default
+                        print("Using input price or default due to prediction failure")
+                    else:
+                        cur.execute("""
+                            UPDATE scraped_data SET price = %s
+                            WHERE id = %s
+                            RETURNING price
+                        """, (predicted_price, new_product['id']))
+                        new_product['price'] = cur.fetchone()['price']
                 conn.commit()
+                if async_prediction:
+                    ensure_prediction_workers()
+                facet_cache.clear()
+                title_index.add(new_product['id'], new_product['title'])
+                near_duplicate_index.add(new_product['id'], new_product['title'])
+                similar_index.add(new_product['id'], new_product)
                 
-                return jsonify({
+                result = {
                     "message": "Product created successfully",
                     "product": {
                         "id": new_product['id'],
                         "title": new_product['title'],
                         "description": new_product['description'],
                         "price": new_product['price'],
-                        "category": new_product['category']
+                        "category": new_product['category'],
+                        "price_status": new_product['price_status']
                     }
-                }), 201
+                }
+                if matches:
+                    result["near_duplicates"] = matches[:5]
+                return jsonify(result), 201
         except Exception as e:
             print("Database error:", str(e))
             conn.rollback()
@@ -465,6 +712,108 @@ def create_product():
         print("Error creating product:", str(e))
         return jsonify({"error": str(e)}), 500
 
+# 5b. PREDICTION STATUS
+@app.route('/products/<int:product_id>/prediction', methods=['GET'])
+def get_prediction_status(product_id):
+    """Report whether a product's price is still pending prediction"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, price, price_status
+                FROM scraped_data
+                WHERE id = %s
+            """, (product_id,))
+            product = cur.fetchone()
+            if product:
+                return jsonify(product)
+            return jsonify({"error": "Product not found"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+# 5c. PRICE HISTORY
+@app.route('/products/<int:product_id>/history', methods=['GET'])
+def get_price_history(product_id):
+    """Price changes for a product, raw or downsampled with ?bucket=
+
+    Query parameters: from / to (ISO timestamps, default last 90 days) and
+    bucket (hour, day, week or month). Raw listings keep the latest
+    MAX_RAW_POINTS changes and set truncated when older ones were left out.
+    """
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    bucket = request.args.get('bucket')
+
+    conn = get_product_read_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            try:
+                points, truncated = fetch_history(cur, product_id, start, end, bucket)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            return conditional_response(jsonify({
+                "product_id": product_id,
+                "from": start.isoformat(),
+                "to": end.isoformat(),
+                "bucket": bucket,
+                "points": points,
+                "truncated": truncated
+            }))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+# 5d. SIMILAR PRODUCTS
+@app.route('/products/<int:product_id>/similar', methods=['GET'])
+def get_similar_products(product_id):
+    """Comparable products, served from the in-memory similarity index"""
+    limit = min(max(request.args.get('limit', default=10, type=int), 1), 50)
+
+    if not similar_index.ensure_loaded(get_read_connection):
+        return jsonify({"error": "Database connection failed"}), 500
+
+    similar = similar_index.similar(product_id, limit)
+    if similar is None:
+        # Possibly written by another worker since the last build
+        conn = get_product_read_connection()
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, title, description, price, category
+                    FROM scraped_data
+                    WHERE id = %s
+                """, (product_id,))
+                product = cur.fetchone()
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            conn.close()
+        if not product:
+            return jsonify({"error": "Product not found"}), 404
+        similar_index.add(product_id, product)
+        similar = similar_index.similar(product_id, limit) or []
+
+    return jsonify({
+        "product_id": product_id,
+        "similar": similar
+    })
+
 # 6. UPDATE PRODUCT
 @app.route('/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
@@ -501,6 +850,10 @@ def update_product(product_id):
             
             if not updates:
                 return jsonify({"error": "No fields to update"}), 400
+            if 'price' in data:
+                # An explicit price replaces a queued prediction
+                cancel_predictions(cur, [product_id])
+                updates.append("price_status = 'predicted'")
                 
             params.extend([product_id])
             
@@ -514,6 +867,11 @@ def update_product(product_id):
             cur.execute(query, params)
             updated_product = cur.fetchone()
             conn.commit()
+            facet_cache.clear()
+            if 'title' in data:
+                title_index.add(updated_product['id'], updated_product['title'])
+                near_duplicate_index.add(updated_product['id'], updated_product['title'])
+            similar_index.add(updated_product['id'], updated_product)
             
             return jsonify({
                 "message": "Product updated successfully",
@@ -546,6 +904,10 @@ def delete_product(product_id):
             
             cur.execute("DELETE FROM scraped_data WHERE id = %s", (product_id,))
             conn.commit()
+            facet_cache.clear()
+            title_index.remove(product_id)
+            near_duplicate_index.remove(product_id)
+            similar_index.remove(product_id)
             
             return jsonify({
                 "message": "Product deleted successfully"
@@ -564,33 +926,345 @@ def search_products():
     query = request.args.get('q', '')
     if not query:
         return jsonify({"error": "Search query parameter 'q' is required"}), 400
+
+    try:
+        fields = parse_fields(SEARCH_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    conn = get_db_connection()
+    conn = get_product_read_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             search_term = f"%{query}%"
-            cur.execute("""
-                SELECT id, title, description, 
+            cur.execute(f"""
+                SELECT {', '.join(fields)}
                 FROM scraped_data 
                 WHERE title ILIKE %s OR description ILIKE %s
                 LIMIT 50
             """, (search_term, search_term))
             products = cur.fetchall()
             
-            return jsonify({
+            return conditional_response(jsonify({
                 "query": query,
                 "count": len(products),
                 "products": products
+            }))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+def build_product_filter(filters):
+    """Build a WHERE clause from bulk filter predicates.
+
+    Supported keys: ids, category, min_price, max_price and
+    min_/max_delta_tunisianet, min_/max_delta_mytech (our price minus the
+    competitor price). Returns (where_sql, params); where_sql is empty if no predicate was given.
+    """
+    if not isinstance(filters, dict):
+        raise ValueError("filter must be an object")
+    clauses = []
+    params = []
+
+    ids = filters.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError("ids must be a list of integers")
+        clauses.append("id = ANY(%s)")
+        params.append(ids)
+
+    category = filters.get('category')
+    if category is not None:
+        clauses.append("category = %s")
+        params.append(str(category).strip())
+
+    for key, op in (('min_price', '>='), ('max_price', '<=')):
+        value = filters.get(key)
+        if value is not None:
+            if not isinstance(value, (int, float)):
+                raise ValueError(f"{key} must be a number")
+            clauses.append(f"price {op} %s")
+            params.append(value)
+
+    for competitor, expression in COMPETITOR_DELTAS.items():
+        for bound, op in (('min', '>='), ('max', '<=')):
+            key = f'{bound}_delta_{competitor}'
+            value = filters.get(key)
+            if value is not None:
+                if not isinstance(value, (int, float)):
+                    raise ValueError(f"{key} must be a number")
+                clauses.append(f"{expression} {op} %s")
+                params.append(value)
+
+    if not clauses:
+        return "", []
+    return "WHERE " + " AND ".join(clauses), params
+
+# 8b. AUTOCOMPLETE
+@app.route('/products/suggest', methods=['GET'])
+def suggest_products():
+    """Title suggestions for a prefix, served from the in-memory index"""
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"error": "Search query parameter 'q' is required"}), 400
+    limit = min(max(request.args.get('limit', default=10, type=int), 1), 20)
+
+    if not title_index.ensure_loaded(get_read_connection):
+        return jsonify({"error": "Database connection failed"}), 500
+
+    return jsonify({
+        "query": query,
+        "suggestions": title_index.suggest(query, limit)
+    })
+
+# 9. BULK UPDATE PRODUCTS
+@app.route('/products/bulk', methods=['PATCH'])
+def bulk_update_products():
+    """Update many products in one transaction.
+
+    Body is either {"products": [{"id": 1, "price": 10.5, ...}, ...]} for
+    per-row values, or {"filter": {...}, "set": {...}} to apply the same
+    change to every matching row. "set" accepts title, description, price,
+    category and price_multiplier.
+    """
+    data = request.get_json()
+
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    rows = data.get('products')
+    if rows is not None:
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"error": "products must be a non-empty list"}), 400
+        values = []
+        for row in rows:
+            if not isinstance(row, dict) or not isinstance(row.get('id'), int):
+                return jsonify({"error": "Each product needs an integer id"}), 400
+            if 'price' in row and not isinstance(row['price'], (int, float)):
+                return jsonify({"error": "Price must be a number"}), 400
+            values.append((
+                row['id'],
+                row.get('title'),
+                row.get('description'),
+                row.get('price'),
+                row.get('category')
+            ))
+    else:
+        changes = data.get('set') or {}
+        if not isinstance(changes, dict):
+            return jsonify({"error": "set must be an object"}), 400
+        try:
+            where_sql, where_params = build_product_filter(data.get('filter') or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not where_sql:
+            return jsonify({"error": "A filter is required for bulk updates"}), 400
+
+        updates = []
+        params = []
+        for field in ['title', 'description', 'category']:
+            if field in changes:
+                updates.append(f"{field} = %s")
+                params.append(changes[field])
+        if 'price' in changes and 'price_multiplier' in changes:
+            return jsonify({"error": "Use either price or price_multiplier, not both"}), 400
+        for field, expression in (('price', "price = %s"), ('price_multiplier', "price = ROUND(price * %s, 2)")):
+            if field in changes:
+                if not isinstance(changes[field], (int, float)):
+                    return jsonify({"error": f"{field} must be a number"}), 400
+                updates.append(expression)
+                params.append(changes[field])
+        sets_price = 'price' in changes or 'price_multiplier' in changes
+        if sets_price:
+            updates.append("price_status = 'predicted'")
+        if not updates:
+            return jsonify({"error": "No fields to update"}), 400
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor() as cur:
+            if rows is not None:
+                # Explicit prices replace queued predictions
+                priced = [value[0] for value in values if value[3] is not None]
+                if priced:
+                    cancel_predictions(cur, priced)
+                # One statement for every row; NULL keeps the current value
+                updated = execute_values(cur, """
+                    UPDATE scraped_data AS s
+                    SET title = COALESCE(v.title, s.title),
+                        description = COALESCE(v.description, s.description),
+                        price = COALESCE(v.price, s.price),
+                        category = COALESCE(v.category, s.category),
+                        price_status = CASE WHEN v.price IS NULL THEN s.price_status ELSE 'predicted' END
+                    FROM (VALUES %s) AS v(id, title, description, price, category)
+                    WHERE s.id = v.id
+                    RETURNING s.id
+                """, values,
+                    template="(%s::int, %s::text, %s::text, %s::numeric, %s::text)",
+                    page_size=len(values),
+                    fetch=True
+                )
+                affected = len(updated)
+            else:
+                if sets_price:
+                    cancel_matching_predictions(cur, where_sql, where_params)
+                cur.execute(
+                    f"UPDATE scraped_data SET {', '.join(updates)} {where_sql}",
+                    params + where_params
+                )
+                affected = cur.rowcount
+            conn.commit()
+            facet_cache.clear()
+            title_index.invalidate()
+            near_duplicate_index.invalidate()
+            similar_index.invalidate()
+
+            return jsonify({
+                "message": "Products updated successfully",
+                "updated": affected
             })
     except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+# 10. BULK DELETE PRODUCTS
+@app.route('/products/bulk', methods=['DELETE'])
+def bulk_delete_products():
+    """Delete every product matching {"ids": [...]} or {"filter": {...}}"""
+    data = request.get_json()
+
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict):
+        return jsonify({"error": "filter must be an object"}), 400
+    filters = dict(filters)
+    if 'ids' in data:
+        filters['ids'] = data['ids']
+    try:
+        where_sql, params = build_product_filter(filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not where_sql:
+        return jsonify({"error": "ids or a filter is required for bulk deletes"}), 400
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM scraped_data {where_sql}", params)
+            deleted = cur.rowcount
+            conn.commit()
+            facet_cache.clear()
+            title_index.invalidate()
+            near_duplicate_index.invalidate()
+            similar_index.invalidate()
+
+            return jsonify({
+                "message": "Products deleted successfully",
+                "deleted": deleted
+            }), 200
+    except Exception as e:
+        conn.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
         if conn:
             conn.close()
 
+EXPORT_COLUMNS = [
+    'id', 'title', 'description', 'category', 'price',
+    'historical_price', 'price_tunisianet', 'price_mytech'
+]
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+# 11. EXPORT PRODUCTS (STREAMING)
+@app.route('/products/export', methods=['GET'])
+def export_products():
+    """Stream the whole catalog as CSV or NDJSON.
+
+    Rows are read through a server-side cursor and recommended prices are
+    predicted one chunk at a time from product_features, so memory stays
+    flat whatever the size of the catalog. Pass predictions=false to skip the model.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+    with_predictions = request.args.get('predictions', 'true').lower() not in ('0', 'false', 'no')
+
+    conn = get_product_read_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    columns = EXPORT_COLUMNS + (['recommended_price'] if with_predictions else [])
+
+    def generate():
+        try:
+            # Named cursor keeps the result set on the server
+            with conn.cursor(name='products_export', cursor_factory=RealDictCursor) as cur:
+                cur.itersize = EXPORT_CHUNK_SIZE
+                cur.execute(f"""
+                    SELECT {', '.join(EXPORT_COLUMNS)}
+                    FROM scraped_data
+                    ORDER BY id
+                """)
+
+                if export_format == 'csv':
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+                    writer.writeheader()
+                    yield buffer.getvalue()
+
+                while True:
+                    rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    if with_predictions:
+                        recommended_prices = predict_products(conn, price_predictor, rows)
+                        for row, recommended in zip(rows, recommended_prices):
+                            row['recommended_price'] = recommended
+
+                    if export_format == 'csv':
+                        buffer.seek(0)
+                        buffer.truncate()
+                        writer.writerows(rows)
+                        yield buffer.getvalue()
+                    else:
+                        yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows)
+        except Exception as e:
+            print("Export error:", str(e))
+            raise
+        finally:
+            conn.close()
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{export_format}'
+    return response
+
 if __name__ == '__main__':
     print("Starting Flask server...")
     print("Configuration:")
@@ -599,4 +1273,8 @@ if __name__ == '__main__':
     print(f"  User: {os.getenv('DB_USER', 'postgres')}")
     print(f"  Port: {os.getenv('DB_PORT', '5432')}")
     print("  (Password hidden for security)")
+    batched_predictor.warm()
+    title_index.warm(get_read_connection)
+    near_duplicate_index.warm(get_read_connection)
+    similar_index.warm(get_read_connection)
     app.run(debug=True)
\ No newline at end of file
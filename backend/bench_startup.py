@@ -0,0 +1,73 @@
+"""Import-time report and budget check for api1.
+
+Runs `python -X importtime -c "import api1"` in a fresh interpreter,
+prints the slowest modules and fails (exit 1) when:
+  * importing api1 takes longer than IMPORT_BUDGET_MS, or
+  * a module listed in DEFERRED_MODULES was imported eagerly.
+
+Usage:
+
+    python bench_startup.py [--top 15]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1500'))
+
+# Must only load on first use (see lazy.py)
+DEFERRED_MODULES = ['pandas', 'sklearn', 'joblib', 'numpy', 'scipy', 'bs4', 'requests', 'price_predictor']
+
+
+def measure(module='api1'):
+    """Return [(cumulative_us, self_us, name)] for every imported module"""
+    env = dict(os.environ, ASYNC_PREDICTIONS='false')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15, help="number of modules to list")
+    parser.add_argument('--module', default='api1')
+    args = parser.parse_args(argv)
+
+    rows = measure(args.module)
+    total_ms = next(cum for cum, _, name in rows if name.strip() == args.module) / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    imported = {name.strip().split('.')[0] for _, _, name in rows}
+    eager = [module for module in DEFERRED_MODULES if module in imported]
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_ms > IMPORT_BUDGET_MS:
+        print(f"FAIL: import time {total_ms:.1f} ms exceeds budget {IMPORT_BUDGET_MS:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
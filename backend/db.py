@@ -0,0 +1,282 @@
+import psycopg2
+import psycopg2.extensions
+import os
+import threading
+import time
+import functools
+from collections import deque
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Comma-separated host[:port] list of read replicas; empty means primary only
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(',') if h.strip()]
+# How long a replica that failed a connect or lag check is skipped
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+# Replicas lagging more than this are treated as unhealthy (0 disables the check)
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '0'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '10'))
+
+# Bound how long a request can block on Postgres (libpq minimum is 2s)
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '3'))
+# Per-statement limit for API connections; 0 disables (migrations, maintenance)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))
+
+# Circuit breaker on primary connects and query failures
+DB_BREAKER_FAILURE_RATE = float(os.getenv('DB_BREAKER_FAILURE_RATE', '0.5'))
+DB_BREAKER_MIN_CALLS = int(os.getenv('DB_BREAKER_MIN_CALLS', '5'))
+DB_BREAKER_WINDOW_SECONDS = float(os.getenv('DB_BREAKER_WINDOW_SECONDS', '30'))
+DB_BREAKER_OPEN_SECONDS = float(os.getenv('DB_BREAKER_OPEN_SECONDS', '10'))
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker.
+
+    closed: calls go through; once at least `min_calls` calls in the last
+    `window_seconds` failed at `failure_rate` or more, the breaker opens.
+    open: calls are refused for `open_seconds`.
+    half_open: one probe call goes through; success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate=DB_BREAKER_FAILURE_RATE, min_calls=DB_BREAKER_MIN_CALLS,
+                 window_seconds=DB_BREAKER_WINDOW_SECONDS, open_seconds=DB_BREAKER_OPEN_SECONDS):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._calls = deque()    # (monotonic time, ok)
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now (claims the probe when half-open)"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_started = now
+                return True
+            # A probe that never reported back (e.g. thread killed) is retried
+            if now - self._probe_started >= self.open_seconds:
+                self._probe_started = now
+                return True
+            return False
+
+    def available(self):
+        """Like allow() without side effects: False means callers would be refused"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return now - self._opened_at >= self.open_seconds
+            return now - self._probe_started >= self.open_seconds
+
+    def retry_after(self):
+        """Seconds until the next probe may run"""
+        with self._lock:
+            since = self._opened_at if self.state == self.OPEN else self._probe_started
+            return max(0.0, self.open_seconds - (time.monotonic() - since))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("Database circuit breaker closed")
+                self.state = self.CLOSED
+                self._calls.clear()
+            self._record_locked(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open_locked()
+                return
+            self._record_locked(False)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if (self.state == self.CLOSED and len(self._calls) >= self.min_calls
+                    and failures / len(self._calls) >= self.failure_rate):
+                self._open_locked()
+
+    def _record_locked(self, ok):
+        now = time.monotonic()
+        self._calls.append((now, ok))
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _open_locked(self):
+        print(f"Database circuit breaker open for {self.open_seconds:g}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+
+    def snapshot(self):
+        with self._lock:
+            failures = sum(1 for _, ok in self._calls if not ok)
+            calls = len(self._calls)
+            state = self.state
+        return {
+            "state": state,
+            "recent_calls": calls,
+            "recent_failures": failures,
+            "retry_after": round(self.retry_after(), 1) if state != self.CLOSED else 0
+        }
+
+
+primary_breaker = CircuitBreaker()
+
+
+@functools.lru_cache(maxsize=None)
+def _breaker_cursor(factory):
+    class BreakerCursor(factory):
+        def execute(self, query, vars=None):
+            try:
+                return super().execute(query, vars)
+            except psycopg2.OperationalError:
+                primary_breaker.record_failure()
+                raise
+    return BreakerCursor
+
+
+class PrimaryConnection(psycopg2.extensions.connection):
+    """Reports OperationalError during queries to primary_breaker.
+
+    Covers connections lost mid-request and statement_timeout
+    (QueryCanceled), which the routes catch themselves, so a database that
+    accepts connects but cannot answer still opens the breaker.
+    """
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _breaker_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        try:
+            return super().commit()
+        except psycopg2.OperationalError:
+            primary_breaker.record_failure()
+            raise
+
+
+def _connect(host, port, statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS, connection_factory=None):
+    return psycopg2.connect(
+        host=host,
+        database=os.getenv('DB_NAME', 'data'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'Anasanas.1'),
+        port=port,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={int(statement_timeout_ms)}',
+        connection_factory=connection_factory
+    )
+
+def get_db_connection(statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS):
+    """Connection to the primary; use for writes and read-your-writes reads.
+
+    Returns None without trying while the circuit breaker is open.
+    Long-running jobs (migrations, maintenance) pass statement_timeout_ms=0.
+    Query failures on the connection count against the breaker too.
+    """
+    if not primary_breaker.allow():
+        return None
+    try:
+        conn = _connect(
+            os.getenv('DB_HOST', 'localhost'), os.getenv('DB_PORT', '5432'),
+            statement_timeout_ms, connection_factory=PrimaryConnection
+        )
+    except Exception as e:
+        primary_breaker.record_failure()
+        print("Database connection error:", str(e))
+        return None
+    primary_breaker.record_success()
+    return conn
+
+
+class ReplicaPool:
+    """Round-robin over healthy read replicas.
+
+    A replica that fails to connect, or lags more than
+    REPLICA_MAX_LAG_SECONDS, is skipped for REPLICA_RETRY_SECONDS and then
+    tried again.
+    """
+
+    def __init__(self, hosts):
+        self.replicas = []
+        for entry in hosts:
+            host, _, port = entry.partition(':')
+            self.replicas.append((host, port or os.getenv('DB_PORT', '5432')))
+        self._down_until = {}
+        self._lag_checked_at = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.replicas), 1)
+            down = dict(self._down_until)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in ordered if down.get(replica, 0) <= now]
+
+    def available(self):
+        """Whether any replica is currently considered healthy"""
+        now = time.monotonic()
+        with self._lock:
+            return any(self._down_until.get(replica, 0) <= now for replica in self.replicas)
+
+    def _mark_down(self, replica, reason):
+        print(f"Read replica {replica[0]}:{replica[1]} unavailable ({reason}), using fallback")
+        with self._lock:
+            self._down_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def _lag_ok(self, replica, conn):
+        if not REPLICA_MAX_LAG_SECONDS:
+            return True
+        now = time.monotonic()
+        if now - self._lag_checked_at.get(replica, 0) < REPLICA_LAG_CHECK_INTERVAL:
+            return True
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)")
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+        self._lag_checked_at[replica] = now
+        return lag <= REPLICA_MAX_LAG_SECONDS
+
+    def connect(self):
+        """Return a connection to a healthy replica, or None"""
+        for replica in self._candidates():
+            try:
+                conn = _connect(*replica)
+            except Exception as e:
+                self._mark_down(replica, str(e).strip())
+                continue
+            try:
+                if self._lag_ok(replica, conn):
+                    return conn
+                self._mark_down(replica, "replication lag")
+            except Exception as e:
+                self._mark_down(replica, str(e).strip())
+            conn.close()
+        return None
+
+
+replica_pool = ReplicaPool(DB_REPLICA_HOSTS)
+
+def get_read_connection():
+    """Connection for read-only queries: a healthy replica, else the primary"""
+    if replica_pool.replicas:
+        conn = replica_pool.connect()
+        if conn:
+            return conn
+    return get_db_connection()
@@ -0,0 +1,76 @@
+"""Fail fast while the primary database is unreachable.
+
+get_db_connection() bounds connects with DB_CONNECT_TIMEOUT and trips
+db.primary_breaker once too many of them fail; connection errors and
+statement timeouts during queries on those connections count as failures
+too. While the breaker is open,
+requests that need the primary are answered with 503 and Retry-After
+before they reach a route, instead of each one returning 500 after a
+failed connect. Product reads still go through when a healthy read
+replica is configured, and otherwise get the last good response for the
+same URL (kept STALE_READ_SECONDS) with a Warning header.
+"""
+import os
+from flask import request, jsonify, Response
+from cache import TTLCache
+from db import primary_breaker, replica_pool
+
+STALE_READ_SECONDS = int(os.getenv('STALE_READ_SECONDS', '300'))
+STALE_READ_MAX_ENTRIES = int(os.getenv('STALE_READ_MAX_ENTRIES', '2048'))
+
+# Product reads: served by replicas when the primary is down
+READ_ENDPOINTS = {'get_products', 'get_product', 'search_products', 'get_price_history', 'export_products'}
+# Reads whose last good response may be replayed during an outage
+STALE_ENDPOINTS = {'get_products', 'get_product', 'search_products', 'get_price_history'}
+# No database needed, or answered from the in-memory indexes
+EXEMPT_ENDPOINTS = {
+    'api_info', 'login_options', 'health_check', 'rate_limit_metrics', 'static',
+    'suggest_products', 'get_similar_products'
+}
+
+stale_cache = TTLCache(ttl=STALE_READ_SECONDS, max_entries=STALE_READ_MAX_ENTRIES)
+
+
+def _unavailable():
+    response = jsonify({"error": "Database unavailable, please retry"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(primary_breaker.retry_after() + 0.999)))
+    return response
+
+
+def check_database():
+    """before_request hook: short-circuit while the breaker is open"""
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in EXEMPT_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    if primary_breaker.available():
+        return None
+
+    if endpoint in READ_ENDPOINTS:
+        if replica_pool.available():
+            return None
+        if request.method == 'GET' and endpoint in STALE_ENDPOINTS:
+            cached = stale_cache.get(request.full_path)
+            if cached is not None:
+                body, mimetype = cached
+                response = Response(body, mimetype=mimetype)
+                response.headers['Warning'] = '110 - "Response is Stale"'
+                return response
+    return _unavailable()
+
+
+def remember_response(response):
+    """after_request hook: keep good product reads for outages.
+
+    Registered after responses.init_app so it runs before compression and
+    stores the plain JSON body.
+    """
+    if (request.method == 'GET' and request.endpoint in STALE_ENDPOINTS
+            and response.status_code == 200 and 'Warning' not in response.headers):
+        stale_cache.set(request.full_path, (response.get_data(), response.mimetype))
+    return response
+
+
+def init_app(app):
+    app.before_request(check_database)
+    app.after_request(remember_response)
@@ -0,0 +1,411 @@
+"""Near-duplicate title detection with MinHash and LSH.
+
+Titles are normalized, cut into character shingles and summarized as a
+MinHash signature. Signatures are split into LSH bands; two titles that
+share any band bucket are candidates, and a candidate counts as a
+duplicate when its estimated Jaccard similarity reaches
+NEAR_DUP_THRESHOLD and both titles have the same variant tokens (the
+numbers in the title, such as 3 in "Pro 3" or "Pro3" and 16 in "16Go",
+and colours). Character shingles barely see those, so "JBL Tour Pro 3
+BEIGE" and "JBL Tour Pro 2 BEIGE" score about 0.89 but are different
+products, while "JBL Tour Pro3 BEIGE" is the same one. Lookups only touch
+the buckets of the query title, so checking an incoming product does not
+scan the catalog.
+
+Like TitleIndex, a stale index (DEDUP_REFRESH_SECONDS, or invalidate()
+after bulk writes) keeps answering while it is rebuilt in the background,
+and writes made during a rebuild are applied on top of its result.
+
+Clean up the existing table in two steps:
+
+    python dedup.py scan --out review.csv   # report, write keep/drop pairs
+    python dedup.py apply review.csv        # delete the reviewed drops
+
+Every drop row is a direct near-duplicate of its keep row (the oldest
+one); pairs are not chained. Delete the lines you do not want removed
+before running apply, which re-checks every pair against the current
+titles.
+"""
+import csv
+import os
+import re
+import sys
+import time
+import struct
+import hashlib
+import threading
+import functools
+from psycopg2.extras import RealDictCursor
+from suggest_index import normalize
+from db import get_db_connection
+
+NEAR_DUP_THRESHOLD = float(os.getenv('NEAR_DUP_THRESHOLD', '0.8'))
+SHINGLE_SIZE = 4
+LSH_BANDS = 16
+LSH_ROWS = 4
+NUM_PERM = LSH_BANDS * LSH_ROWS
+DEDUP_REFRESH_SECONDS = float(os.getenv('DEDUP_REFRESH_SECONDS', '300'))
+
+# Variant words that tell otherwise identical titles apart
+VARIANT_WORDS = frozenset(os.getenv('NEAR_DUP_VARIANT_WORDS', (
+    'noir blanc gris argent or dore rose rouge bleu vert jaune orange violet marron beige '
+    'black white grey gray silver gold pink red blue green yellow purple brown'
+)).split())
+
+# Largest 32-bit prime: a * h + b stays below 2**64 for 32-bit a, b, h
+_PRIME = 4294967291
+
+_DIGITS = re.compile(r'[0-9]+')
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations():
+    # Fixed seeds so signatures are stable across processes and restarts
+    import numpy as np
+    a, b = [], []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f'minhash-{i}'.encode('utf-8'), digest_size=8).digest()
+        x, y = struct.unpack('<II', digest)
+        a.append(x % (_PRIME - 1) + 1)
+        b.append(y % _PRIME)
+    return np.array(a, dtype=np.uint64), np.array(b, dtype=np.uint64)
+
+
+def shingles(title):
+    text = normalize(title)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(title):
+    """MinHash signature (tuple of NUM_PERM ints) of a title"""
+    # numpy is imported on first use to keep api1 import time low
+    import numpy as np
+    title_shingles = shingles(title)
+    if not title_shingles:
+        return None
+    perm_a, perm_b = _permutations()
+    hashes = np.fromiter(
+        (struct.unpack('<I', hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest())[0] for s in title_shingles),
+        dtype=np.uint64,
+        count=len(title_shingles)
+    )
+    # One row per shingle, one column per permutation; min over shingles
+    values = (np.outer(hashes, perm_a) + perm_b) % _PRIME
+    return tuple(values.min(axis=0).tolist())
+
+
+def variant_tokens(title):
+    """What must match exactly: the numbers in a title, and its colours.
+
+    Numbers are digit runs, so "Pro3", "Pro 3" and "pro-03" all give 3.
+    """
+    words = normalize(title).split()
+    numbers = {str(int(digits)) for word in words for digits in _DIGITS.findall(word)}
+    return frozenset(numbers | {word for word in words if word in VARIANT_WORDS})
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(sig, variants):
+    # Titles with different variant tokens never match, so they never share
+    # a bucket either; keeps buckets of "Galaxy A15 / A25 / A35" small
+    return [(band, sig[band * LSH_ROWS:(band + 1) * LSH_ROWS], variants) for band in range(LSH_BANDS)]
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._signatures = {}   # product_id -> signature
+        self._titles = {}       # product_id -> title
+        self._variants = {}     # product_id -> variant_tokens(title)
+        self._buckets = {}      # (band, rows, variants) -> set(product_id)
+        self._writes = {}       # product_id -> (seq, title or None if removed)
+        self._seq = 0
+        self._invalidated_seq = 0
+        self._loaded_seq = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._loaded_at = None
+
+    def load(self, rows, start_seq=None):
+        """Replace the index with (id, title) rows.
+
+        Writes newer than `start_seq` (taken before the rows were read) are
+        kept on top of the new index.
+        """
+        if start_seq is None:
+            start_seq = self._seq
+        signatures, titles, variants, buckets = {}, {}, {}, {}
+        for product_id, title in rows:
+            sig = signature(title)
+            if sig is None:
+                continue
+            signatures[product_id] = sig
+            titles[product_id] = title
+            variants[product_id] = variant_tokens(title)
+            for key in _bands(sig, variants[product_id]):
+                buckets.setdefault(key, set()).add(product_id)
+        with self._lock:
+            self._signatures, self._titles, self._variants, self._buckets = signatures, titles, variants, buckets
+            # Keep writes made while the build was reading the table
+            self._writes = {pid: entry for pid, entry in self._writes.items() if entry[0] > start_seq}
+            for product_id, (_, title) in self._writes.items():
+                self._remove_locked(product_id)
+                sig = signature(title) if title is not None else None
+                if sig is not None:
+                    self._insert_locked(product_id, title, sig)
+            self._loaded_seq = start_seq
+            self._loaded_at = time.monotonic()
+
+    def load_from_db(self, conn):
+        start_seq = self._seq
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT id, title FROM scraped_data WHERE title IS NOT NULL")
+            self.load(((row['id'], row['title']) for row in cur.fetchall()), start_seq)
+
+    def _is_fresh(self):
+        loaded_at = self._loaded_at
+        return (loaded_at is not None
+                and time.monotonic() - loaded_at < DEDUP_REFRESH_SECONDS
+                and self._invalidated_seq <= self._loaded_seq)
+
+    def _rebuild(self, connect):
+        with self._build_lock:
+            # Another thread may have rebuilt while we waited
+            if self._is_fresh():
+                return
+            conn = connect()
+            if not conn:
+                return
+            try:
+                self.load_from_db(conn)
+            finally:
+                conn.close()
+
+    def ensure_loaded(self, connect):
+        """Block for the first build; later rebuilds run in the background.
+
+        Returns True when an index is available.
+        """
+        if self._loaded_at is None:
+            self._rebuild(connect)
+        elif not self._is_fresh() and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+        return self._loaded_at is not None
+
+    def warm(self, connect):
+        """Non-blocking ensure_loaded: start a background build if needed.
+
+        Returns True when an index (possibly stale) is available now.
+        """
+        if not self._is_fresh() and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+        return self._loaded_at is not None
+
+    def invalidate(self):
+        """Rebuild in the background on the next lookup (after set-based writes)"""
+        with self._lock:
+            self._seq += 1
+            self._invalidated_seq = self._seq
+
+    def add(self, product_id, title):
+        sig = signature(title)
+        with self._lock:
+            self._record_locked(product_id, title)
+            if self._loaded_at is None:
+                return
+            self._remove_locked(product_id)
+            if sig is not None:
+                self._insert_locked(product_id, title, sig)
+
+    def _record_locked(self, product_id, title):
+        # Only needed by a build in progress, which re-applies them
+        if self._build_lock.locked():
+            self._seq += 1
+            self._writes[product_id] = (self._seq, title)
+
+    def _insert_locked(self, product_id, title, sig):
+        self._signatures[product_id] = sig
+        self._titles[product_id] = title
+        self._variants[product_id] = variant_tokens(title)
+        for key in _bands(sig, self._variants[product_id]):
+            self._buckets.setdefault(key, set()).add(product_id)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._record_locked(product_id, None)
+            self._remove_locked(product_id)
+
+    def _remove_locked(self, product_id):
+        sig = self._signatures.pop(product_id, None)
+        self._titles.pop(product_id, None)
+        variants = self._variants.pop(product_id, None)
+        if sig is None:
+            return
+        for key in _bands(sig, variants):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(product_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, title, exclude_id=None):
+        """Return [{id, title, similarity}] of near-duplicates, best first"""
+        sig = signature(title)
+        return self._find_signature(sig, variant_tokens(title), exclude_id) if sig is not None else []
+
+    def _find_signature(self, sig, variants, exclude_id=None):
+        with self._lock:
+            candidates = set()
+            for key in _bands(sig, variants):
+                candidates |= self._buckets.get(key, set())
+            candidates.discard(exclude_id)
+            matches = []
+            for product_id in candidates:
+                score = similarity(sig, self._signatures[product_id])
+                if score >= self.threshold:
+                    matches.append({"id": product_id, "title": self._titles[product_id], "similarity": score})
+        matches.sort(key=lambda match: (-match['similarity'], match['id']))
+        return matches
+
+    def find_batch(self, titles):
+        """Check a batch of incoming titles against the index and each other.
+
+        Returns one match list per title. A title that duplicates an earlier
+        title of the same batch gets {"batch_index": i, ...} entries; that
+        check goes through a batch-local LSH index, not pairwise.
+        """
+        batch = NearDuplicateIndex(self.threshold)
+        results = []
+        for i, title in enumerate(titles):
+            sig = signature(title)
+            if sig is None:
+                results.append([])
+                continue
+            variants = variant_tokens(title)
+            matches = self._find_signature(sig, variants)
+            for match in batch._find_signature(sig, variants):
+                matches.append({"batch_index": match['id'], "title": match['title'], "similarity": match['similarity']})
+            results.append(matches)
+            batch._insert_locked(i, title, sig)
+        return results
+
+    def duplicate_pairs(self):
+        """(keep_id, drop_id, similarity) for every row to drop, oldest kept.
+
+        Not transitive: a row is only dropped for a keep row it matches
+        directly, and a dropped row never keeps others, so a chain
+        A ~ B ~ C with A !~ C drops B but keeps C.
+        """
+        with self._lock:
+            dropped = set()
+            pairs = []
+            for keep in sorted(self._signatures):
+                if keep in dropped:
+                    continue
+                for match in self._find_signature(self._signatures[keep], self._variants[keep], keep):
+                    if match['id'] > keep and match['id'] not in dropped:
+                        dropped.add(match['id'])
+                        pairs.append((keep, match['id'], match['similarity']))
+        return pairs
+
+
+near_duplicate_index = NearDuplicateIndex()
+
+
+REVIEW_COLUMNS = ['keep_id', 'keep_title', 'drop_id', 'drop_title', 'similarity']
+
+
+def scan(conn, out_path=None):
+    """Print keep/drop pairs and optionally write them to a review CSV"""
+    index = NearDuplicateIndex()
+    index.load_from_db(conn)
+    pairs = index.duplicate_pairs()
+    for keep, drop, score in pairs:
+        print(f"keep {keep}: {index._titles[keep]}")
+        print(f"  drop {drop} ({score:.2f}): {index._titles[drop]}")
+    print(f"{len(pairs)} near-duplicate rows")
+    if out_path:
+        with open(out_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(REVIEW_COLUMNS)
+            for keep, drop, score in pairs:
+                writer.writerow([keep, index._titles[keep], drop, index._titles[drop], f"{score:.3f}"])
+        print(f"Review {out_path}, remove the pairs to keep, then run: python dedup.py apply {out_path}")
+    return pairs
+
+
+def apply_review(conn, path):
+    """Delete the drop rows of a reviewed CSV whose pair still matches.
+
+    A pair is skipped when either row is gone or its titles are no longer
+    near-duplicates. Returns the number of deleted rows.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        pairs = [(int(row['keep_id']), int(row['drop_id'])) for row in csv.DictReader(f)]
+    if not pairs:
+        return 0
+    try:
+        with conn.cursor() as cur:
+            ids = sorted({product_id for pair in pairs for product_id in pair})
+            # Lock the rows so titles cannot change between the check and the delete
+            cur.execute("SELECT id, title FROM scraped_data WHERE id = ANY(%s) FOR UPDATE", (ids,))
+            titles = dict(cur.fetchall())
+            index = NearDuplicateIndex()
+            drops = []
+            for keep, drop in pairs:
+                if keep not in titles or drop not in titles:
+                    print(f"skip {keep}/{drop}: row no longer exists")
+                    continue
+                sig = signature(titles[drop])
+                index.load([(keep, titles[keep])])
+                if sig is None or not index._find_signature(sig, variant_tokens(titles[drop])):
+                    print(f"skip {keep}/{drop}: titles no longer match")
+                    continue
+                drops.append(drop)
+            cur.execute("DELETE FROM scraped_data WHERE id = ANY(%s)", (drops,))
+            deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def main(argv):
+    usage = "Usage: python dedup.py scan [--out review.csv] | python dedup.py apply review.csv"
+    if argv[:1] == ['scan'] and '--apply' in argv:
+        print("scan --apply was removed: write a review file with --out, then run apply on it")
+        return 2
+    if argv[:1] == ['scan']:
+        out_path = argv[argv.index('--out') + 1] if '--out' in argv[:-1] else None
+    elif argv[:1] == ['apply'] and len(argv) == 2:
+        out_path = None
+    else:
+        print(usage)
+        return 2
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        if argv[0] == 'scan':
+            scan(conn, out_path)
+        else:
+            print(f"Deleted {apply_review(conn, argv[1])} rows")
+        return 0
+    except Exception as e:
+        conn.rollback()
+        print("Dedup error:", str(e))
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
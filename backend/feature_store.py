@@ -0,0 +1,116 @@
+"""Lookups into the product_features table.
+
+product_features is kept current by the scraped_data_features_refresh
+trigger (migration 7), so scoring a stored product is one primary-key
+lookup plus a model call instead of recomputing features from raw columns.
+After loads that bypass the trigger (COPY with triggers disabled, restores)
+or a change to the feature definition, rebuild it with:
+
+    python feature_store.py refresh            # every product
+    python feature_store.py refresh 12 34      # only these ids
+"""
+import sys
+from psycopg2.extras import RealDictCursor
+from db import get_db_connection
+
+FEATURE_COLUMNS = [
+    'historical_price', 'price_tunisianet', 'price_mytech',
+    'historical_discount', 'price_diff_competitors',
+    'price_ratio_competitors', 'discount_impact'
+]
+
+
+def fetch_features(cur, product_ids):
+    """Return {product_id: feature row} for the given ids"""
+    if not product_ids:
+        return {}
+    cur.execute(f"""
+        SELECT product_id, category, price, {', '.join(FEATURE_COLUMNS)}
+        FROM product_features
+        WHERE product_id = ANY(%s)
+    """, (list(product_ids),))
+    return {row['product_id']: row for row in cur.fetchall()}
+
+
+def refresh_features(conn, product_ids=None):
+    """Recompute features for `product_ids` (or every product).
+
+    The trigger handles normal writes; this is for rows loaded with
+    triggers disabled or after changing the feature definition.
+    Returns the number of rows refreshed.
+    """
+    where_sql = "WHERE product_id = ANY(%s)" if product_ids is not None else ""
+    params = (list(product_ids),) if product_ids is not None else ()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO product_features (
+                    product_id, category, price, {', '.join(FEATURE_COLUMNS)}
+                )
+                SELECT product_id, category, price, {', '.join(FEATURE_COLUMNS)}
+                FROM product_features_source
+                {where_sql}
+                ON CONFLICT (product_id) DO UPDATE SET
+                    category = EXCLUDED.category,
+                    price = EXCLUDED.price,
+                    {', '.join(f'{col} = EXCLUDED.{col}' for col in FEATURE_COLUMNS)},
+                    updated_at = CURRENT_TIMESTAMP
+            """, params)
+            refreshed = cur.rowcount
+        conn.commit()
+        return refreshed
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def predict_products(conn, predictor, products):
+    """Predict prices for stored products, in order.
+
+    `products` are dicts with 'id', 'category' and 'price'. Products with a
+    feature row are scored from it; any without one (not yet refreshed)
+    fall back to PricePredictor.predict_prices.
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        features = fetch_features(cur, [product['id'] for product in products])
+
+    prices = [None] * len(products)
+    stored = [i for i, product in enumerate(products) if product['id'] in features]
+    missing = [i for i, product in enumerate(products) if product['id'] not in features]
+
+    if stored:
+        rows = [features[products[i]['id']] for i in stored]
+        for i, price in zip(stored, predictor.predict_from_features(rows)):
+            prices[i] = price
+    if missing:
+        for i, price in zip(missing, predictor.predict_prices([products[i] for i in missing])):
+            prices[i] = price
+    return prices
+
+
+def main(argv):
+    if argv[:1] != ['refresh']:
+        print("Usage: python feature_store.py refresh [product_id ...]")
+        return 2
+    try:
+        product_ids = [int(arg) for arg in argv[1:]] or None
+    except ValueError:
+        print("Product ids must be integers")
+        return 2
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        refreshed = refresh_features(conn, product_ids)
+        print(f"Refreshed features for {refreshed} products")
+        return 0
+    except Exception as e:
+        print("Feature refresh error:", str(e))
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
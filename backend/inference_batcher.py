@@ -0,0 +1,105 @@
+"""Dynamic micro-batching in front of PricePredictor.
+
+Concurrent request threads each submit one product's product_features
+row; a dispatcher thread collects whatever arrives within
+PREDICT_MAX_WAIT_MS (up to PREDICT_MAX_BATCH_SIZE rows) and runs one matrix
+prediction for all of them. Each caller gets its own Future back.
+
+The dispatcher loads the predictor (pandas, scikit-learn and the model
+behind lazy.LazyAttribute) before taking work. warm() starts that in the
+background; callers that must not wait for it (e.g. inside a transaction)
+check ready() first and fall back to a queued prediction.
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+PREDICT_MAX_BATCH_SIZE = int(os.getenv('PREDICT_MAX_BATCH_SIZE', '32'))
+PREDICT_MAX_WAIT_MS = float(os.getenv('PREDICT_MAX_WAIT_MS', '5'))
+PREDICT_TIMEOUT = float(os.getenv('PREDICT_TIMEOUT', '5'))
+
+
+class BatchingPredictor:
+    def __init__(self, predictor, max_batch_size=PREDICT_MAX_BATCH_SIZE, max_wait_ms=PREDICT_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='price-batcher', daemon=True)
+                self._thread.start()
+
+    def warm(self):
+        """Start the dispatcher, which loads the predictor in the background"""
+        self._ensure_started()
+
+    def ready(self):
+        """Whether the predictor has been loaded (or failed to load)"""
+        return self._ready.is_set()
+
+    def submit(self, features):
+        """Queue one product_features row and return a Future for its predicted price"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def predict(self, features, timeout=PREDICT_TIMEOUT):
+        """Blocking helper: submit and wait up to `timeout` for the result.
+
+        Before ready() the wait includes loading the predictor.
+        """
+        return self.submit(features).result(timeout=timeout)
+
+    def _collect_batch(self):
+        # Block for the first item, then wait at most max_wait for more
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _load(self):
+        resolve = getattr(self.predictor, 'resolve', None)
+        try:
+            if resolve is not None:
+                resolve()
+        except Exception as e:
+            # Batches will fail and report it to their callers
+            logger.error(f"Error loading predictor: {str(e)}")
+        finally:
+            self._ready.set()
+
+    def _run(self):
+        self._load()
+        while True:
+            batch = self._collect_batch()
+            rows = [item for item, _ in batch]
+            try:
+                prices = self.predictor.predict_from_features(rows)
+                for (_, future), price in zip(batch, prices):
+                    future.set_result(price)
+            except Exception as e:
+                logger.error(f"Error predicting batch of {len(batch)}: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
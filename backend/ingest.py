@@ -0,0 +1,310 @@
+"""Incremental ingestion of scraped products into scraped_data.
+
+Most of a re-scrape is what is already stored. Each batch is loaded into a
+temporary table and compared by title, in one set-based statement, against
+the stored content_hash (migration 9): new titles are inserted, rows whose
+hash differs are updated and unchanged rows are not written at all, so
+their description / analysis are not rewritten and the price history and
+feature store triggers do not fire.
+
+    python ingest.py products.ndjson    # one JSON object per line
+    python ingest.py products.csv       # header row with column names
+    python ingest.py -                  # NDJSON on stdin
+
+Prices are parsed like migration 3 parses scraper text ('1\xa0049,000 DT'
+is 1049000 millimes); a row with a price that is not a number is counted
+as invalid and skipped, like a row without a title. A scraped price
+replaces a queued prediction (prediction_queue.py) the same way a price set
+through the API does: the job is cancelled and the row is no longer
+'pending'.
+
+A column that no row of a batch provides keeps its stored value. New
+titles that are near-duplicates (dedup.py) of a stored title or of an
+earlier row of the run are skipped and counted as near_duplicates; pass
+--allow-near-duplicates to insert them anyway. Every run is recorded in
+ingest_runs with its counts.
+"""
+import os
+import re
+import sys
+import csv
+import math
+import json
+import datetime
+import itertools
+from decimal import Decimal
+from psycopg2.extras import execute_values
+from db import get_db_connection
+from dedup import NearDuplicateIndex
+from prediction_queue import cancel_matching_predictions
+
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '1000'))
+
+# Scraped columns, in scraped_data_content_hash() argument order
+INGEST_COLUMNS = [
+    'title', 'image_url', 'price', 'description', 'analysis', 'season', 'category',
+    'historical_price', 'price_tunisianet', 'price_mytech', 'historical_discount'
+]
+# Same types as scraped_data, so content hashes of equal values match
+STAGING_TYPES = {
+    'title': 'TEXT',
+    'image_url': 'TEXT',
+    'price': 'NUMERIC(14, 2)',
+    'description': 'TEXT',
+    'analysis': 'TEXT',
+    'season': 'VARCHAR(50)',
+    'category': 'VARCHAR(100)',
+    'historical_price': 'NUMERIC(14, 2)',
+    'price_tunisianet': 'NUMERIC(14, 2)',
+    'price_mytech': 'NUMERIC(14, 2)',
+    'historical_discount': 'NUMERIC(6, 3)',
+}
+
+# Digits allowed before the decimal point, from the NUMERIC(p, s) types
+NUMERIC_DIGITS = {
+    name: int(m.group(1)) - int(m.group(2))
+    for name, column_type in STAGING_TYPES.items()
+    if (m := re.fullmatch(r'NUMERIC\((\d+), (\d+)\)', column_type))
+}
+_NON_NUMERIC = re.compile(r'[^0-9.]')
+_NUMBER = re.compile(r'[0-9]+(\.[0-9]+)?')
+
+STAT_KEYS = ('received', 'inserted', 'updated', 'unchanged', 'duplicates', 'invalid', 'near_duplicates')
+
+
+def _parse_price(value, digits):
+    """Parse a scraped price the way migration 3 does; None if it is not one.
+
+    In text, everything but digits and '.' is dropped ('DT', spaces, the
+    comma). Values too large for the column are rejected too.
+    """
+    if isinstance(value, str):
+        value = _NON_NUMERIC.sub('', value)
+        value = Decimal(value) if _NUMBER.fullmatch(value) else None
+    elif isinstance(value, bool) or not isinstance(value, (int, float, Decimal)) or not math.isfinite(value):
+        value = None
+    if value is None or abs(value) >= 10 ** digits:
+        return None
+    return value
+
+
+def _clean(row):
+    """Keep known columns; empty or 'NULL' strings (CSV) become NULL, prices are parsed.
+
+    Returns None for a row with a price that is not a number.
+    """
+    cleaned = {}
+    for key, value in row.items():
+        if key not in STAGING_TYPES:
+            continue
+        if isinstance(value, str) and value.strip().upper() in ('', 'NULL'):
+            value = None
+        if value is not None and key in NUMERIC_DIGITS:
+            value = _parse_price(value, NUMERIC_DIGITS[key])
+            if value is None:
+                return None
+        cleaned[key] = value
+    return cleaned
+
+
+def _create_staging(cur):
+    columns = ', '.join(f"{name} {STAGING_TYPES[name]}" for name in INGEST_COLUMNS)
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS scraped_ingest (
+            ord INTEGER NOT NULL,
+            {columns}
+        ) ON COMMIT DELETE ROWS
+    """)
+
+
+def _skip_near_duplicates(rows, index):
+    """Split rows into (kept, skipped) with NearDuplicateIndex.find_batch.
+
+    A row whose exact title is stored (or earlier in the batch) is an
+    update and always kept; a new title with near-duplicate matches is
+    skipped.
+    """
+    kept, skipped = [], []
+    for row, matches in zip(rows, index.find_batch([row['title'] for row in rows])):
+        exact = any(match['title'] == row['title'] for match in matches)
+        (kept if exact or not matches else skipped).append(row)
+    return kept, skipped
+
+
+def ingest_batch(cur, rows, near_duplicates=None):
+    """Insert new and update changed rows of one batch; returns its counts.
+
+    Runs inside the caller's transaction. Within the batch the last row
+    for a title wins. With a NearDuplicateIndex, new near-duplicate titles
+    are skipped and inserted rows are added to the index.
+    """
+    rows = [_clean(row) for row in rows]
+    valid = [row for row in rows if row is not None and row.get('title')]
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    stats['invalid'] = len(rows) - len(valid)
+    if near_duplicates is not None and valid:
+        valid, skipped = _skip_near_duplicates(valid, near_duplicates)
+        stats['near_duplicates'] = len(skipped)
+    if not valid:
+        return stats
+
+    columns = [name for name in INGEST_COLUMNS if any(name in row for row in valid)]
+    _create_staging(cur)
+    execute_values(
+        cur,
+        f"INSERT INTO scraped_ingest (ord, {', '.join(columns)}) VALUES %s",
+        [(i, *[row.get(name) for name in columns]) for i, row in enumerate(valid)],
+        page_size=INGEST_BATCH_SIZE
+    )
+
+    # Columns the batch does not provide are hashed from the stored row
+    hash_args = ', '.join(f"i.{name}" if name in columns else f"d.{name}" for name in INGEST_COLUMNS)
+    assignments = [f"{name} = i.{name}" for name in columns if name != 'title']
+    changed = f"d.content_hash IS DISTINCT FROM scraped_data_content_hash({hash_args})"
+    if 'price' in columns:
+        # Scraped prices replace queued predictions; cancelled before the
+        # update so a worker holding the job is waited for, not deadlocked
+        cancel_matching_predictions(cur, """
+            WHERE price_status = 'pending' AND title IN (
+                SELECT title FROM (
+                    SELECT DISTINCT ON (title) title, price
+                    FROM scraped_ingest
+                    ORDER BY title, ord DESC
+                ) latest
+                WHERE price IS NOT NULL
+            )
+        """, ())
+        assignments.append("price_status = CASE WHEN i.price IS NULL THEN d.price_status ELSE 'predicted' END")
+        changed = f"({changed} OR (d.price_status = 'pending' AND i.price IS NOT NULL))"
+    if assignments:
+        updated = f"""
+            UPDATE scraped_data d
+            SET {', '.join(assignments)}
+            FROM incoming i
+            WHERE d.title = i.title
+              AND {changed}
+            RETURNING d.id
+        """
+    else:
+        updated = "SELECT NULL::INTEGER AS id WHERE false"
+
+    cur.execute(f"""
+        WITH incoming AS (
+            SELECT DISTINCT ON (title) *
+            FROM scraped_ingest
+            ORDER BY title, ord DESC
+        ),
+        updated AS ({updated}),
+        inserted AS (
+            INSERT INTO scraped_data ({', '.join(columns)})
+            SELECT {', '.join(f'i.{name}' for name in columns)}
+            FROM incoming i
+            WHERE NOT EXISTS (SELECT 1 FROM scraped_data d WHERE d.title = i.title)
+            -- Inserted concurrently by another writer: counted as unchanged
+            ON CONFLICT (title) DO NOTHING
+            RETURNING id, title
+        )
+        SELECT
+            (SELECT COUNT(*) FROM incoming) AS distinct_titles,
+            (SELECT COUNT(*) FROM updated) AS updated,
+            (SELECT COALESCE(json_agg(json_build_array(id, title)), '[]') FROM inserted) AS inserted
+    """)
+    distinct_titles, updated_count, inserted_rows = cur.fetchone()
+    inserted = len(inserted_rows)
+    if near_duplicates is not None:
+        for product_id, title in inserted_rows:
+            near_duplicates.add(product_id, title)
+    stats.update(
+        received=len(valid),
+        inserted=inserted,
+        updated=updated_count,
+        unchanged=distinct_titles - inserted - updated_count,
+        duplicates=len(valid) - distinct_titles
+    )
+    return stats
+
+
+def ingest(conn, rows, source=None, batch_size=INGEST_BATCH_SIZE, skip_near_duplicates=True):
+    """Ingest an iterable of product dicts, committing per batch.
+
+    Returns the run's totals, which are also stored in ingest_runs.
+    """
+    started_at = datetime.datetime.now()
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    rows = iter(rows)
+    try:
+        index = None
+        if skip_near_duplicates:
+            index = NearDuplicateIndex()
+            index.load_from_db(conn)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            with conn.cursor() as cur:
+                stats = ingest_batch(cur, batch, index)
+            conn.commit()
+            for key in STAT_KEYS:
+                totals[key] += stats[key]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Partial runs are recorded too, with what was committed
+        record_run(conn, source, started_at, totals)
+    return totals
+
+
+def record_run(conn, source, started_at, totals):
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO ingest_runs (source, started_at, {', '.join(STAT_KEYS)})
+                VALUES (%s, %s, {', '.join(['%s'] * len(STAT_KEYS))})
+            """, (source, started_at, *[totals[key] for key in STAT_KEYS]))
+        conn.commit()
+    except Exception as e:
+        # Never hide the ingest result (or its error) behind this one
+        conn.rollback()
+        print("Could not record ingest run:", str(e))
+
+
+def read_rows(path):
+    """Yield product dicts from an NDJSON or CSV file ('-' reads NDJSON from stdin)"""
+    if path == '-':
+        for line in sys.stdin:
+            if line.strip():
+                yield json.loads(line)
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv):
+    allow_near_duplicates = '--allow-near-duplicates' in argv
+    argv = [arg for arg in argv if arg != '--allow-near-duplicates']
+    if len(argv) != 1:
+        print("Usage: python ingest.py [--allow-near-duplicates] <products.ndjson|products.csv|->")
+        return 2
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        totals = ingest(conn, read_rows(argv[0]), source=argv[0], skip_near_duplicates=not allow_near_duplicates)
+        print(", ".join(f"{key} {totals[key]}" for key in STAT_KEYS))
+        return 0
+    except Exception as e:
+        print("Ingest error:", str(e))
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,33 @@
+"""Deferred imports for modules that are expensive to load.
+
+api1.py must import quickly (worker boot, test collection, auth-only
+traffic), so pandas / scikit-learn and the model file are only loaded
+the first time a prediction is actually needed.
+"""
+import importlib
+import threading
+
+
+class LazyAttribute:
+    """Proxy for `module.attr` that imports the module on first use"""
+
+    def __init__(self, module_name, attr):
+        self._module_name = module_name
+        self._attr = attr
+        self._target = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module_name)
+                    self._target = getattr(module, self._attr)
+        return self._target
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
@@ -0,0 +1,448 @@
+"""Versioned schema migrations for the product database.
+
+Run once per deploy, before starting the API:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied / pending versions
+"""
+import sys
+from db import get_db_connection
+
+# Arbitrary key for pg_advisory_xact_lock so two deploys never migrate at once
+MIGRATION_LOCK_ID = 7270260
+
+# Prices are stored in millimes (1 DT = 1000), the unit of the competitor
+# columns and of PricePredictor.clean_price, which reads the scraped
+# '1\xa0049,000 DT' as 1049000.
+PRICE_TYPE = 'NUMERIC(14, 2)'
+
+
+def _parse_price(column):
+    """SQL parsing a scraped price the way PricePredictor.clean_price does.
+
+    Everything but digits and '.' is dropped ('DT', spaces, the comma);
+    text that still is not a number becomes NULL.
+    """
+    digits = f"regexp_replace({column}::text, '[^0-9.]', '', 'g')"
+    return f"CASE WHEN {digits} ~ '^[0-9]+(\\.[0-9]+)?$' THEN {digits}::numeric END"
+
+
+# Each migration is (version, name, [statements]). Versions are applied in
+# order and recorded in schema_migrations; never edit a shipped migration,
+# append a new one instead.
+MIGRATIONS = [
+    (1, "create_users", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "create_scraped_data", [
+        """
+        CREATE TABLE IF NOT EXISTS scraped_data (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            image_url TEXT,
+            price NUMERIC(14, 2),
+            description TEXT,
+            analysis TEXT,
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_id INTEGER,
+            season VARCHAR(50),
+            category VARCHAR(100) DEFAULT 'electronics',
+            historical_price NUMERIC(14, 2),
+            price_tunisianet NUMERIC(14, 2),
+            price_mytech NUMERIC(14, 2),
+            historical_discount NUMERIC(6, 3)
+        )
+        """,
+    ]),
+    (3, "scraped_data_numeric_prices", [
+        # Tables created by the scraper hold price as text ('1\xa0049,000 DT')
+        # and CREATE TABLE IF NOT EXISTS above leaves them alone. Convert
+        # every price column in place (a no-op cast on numeric columns);
+        # values that do not parse become NULL. Must run before the
+        # indexes, views and generated columns that do arithmetic on price.
+        f"""
+        ALTER TABLE scraped_data
+            ALTER COLUMN price TYPE {PRICE_TYPE} USING {_parse_price('price')},
+            ALTER COLUMN historical_price TYPE {PRICE_TYPE} USING {_parse_price('historical_price')},
+            ALTER COLUMN price_tunisianet TYPE {PRICE_TYPE} USING {_parse_price('price_tunisianet')},
+            ALTER COLUMN price_mytech TYPE {PRICE_TYPE} USING {_parse_price('price_mytech')},
+            ALTER COLUMN historical_discount TYPE NUMERIC(6, 3) USING {_parse_price('historical_discount')}
+        """,
+        "COMMENT ON COLUMN scraped_data.price IS 'millimes (1 DT = 1000)'",
+        "COMMENT ON COLUMN scraped_data.historical_price IS 'millimes (1 DT = 1000)'",
+        "COMMENT ON COLUMN scraped_data.price_tunisianet IS 'millimes (1 DT = 1000)'",
+        "COMMENT ON COLUMN scraped_data.price_mytech IS 'millimes (1 DT = 1000)'",
+        "COMMENT ON COLUMN scraped_data.historical_discount IS 'percent'",
+    ]),
+    (4, "scraped_data_indexes", [
+        # Duplicate check in create_product and exact title lookups.
+        # Fails loudly if the table already holds duplicate titles; clean
+        # them up before re-running.
+        "CREATE UNIQUE INDEX IF NOT EXISTS scraped_data_title_key ON scraped_data (title)",
+        # Category browsing sorted / filtered by price
+        "CREATE INDEX IF NOT EXISTS scraped_data_category_price_idx ON scraped_data (category, price)",
+        # ILIKE '%term%' in search_products
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS scraped_data_title_trgm_idx ON scraped_data USING gin (title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS scraped_data_description_trgm_idx ON scraped_data USING gin (description gin_trgm_ops)",
+        # Full-text search over title and description
+        """
+        CREATE INDEX IF NOT EXISTS scraped_data_fts_idx ON scraped_data
+        USING gin (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, '')))
+        """,
+    ]),
+    (5, "scraped_data_browse_indexes", [
+        # Sorted browsing on GET /products
+        "CREATE INDEX IF NOT EXISTS scraped_data_price_idx ON scraped_data (price)",
+        # Competitor delta filters / sorts; must match COMPETITOR_DELTAS in api1.py
+        "CREATE INDEX IF NOT EXISTS scraped_data_delta_tunisianet_idx ON scraped_data ((price - price_tunisianet))",
+        "CREATE INDEX IF NOT EXISTS scraped_data_delta_mytech_idx ON scraped_data ((price - price_mytech))",
+    ]),
+    (6, "prediction_jobs", [
+        # 'pending' while a queued prediction has not replaced the input price
+        "ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS price_status VARCHAR(20) NOT NULL DEFAULT 'predicted'",
+        """
+        CREATE TABLE IF NOT EXISTS prediction_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL REFERENCES scraped_data (id) ON DELETE CASCADE,
+            category VARCHAR(100),
+            input_price NUMERIC(14, 2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS prediction_jobs_product_id_idx ON prediction_jobs (product_id)",
+    ]),
+    (7, "product_features", [
+        # Model inputs derived from scraped_data; see feature_store.py
+        """
+        CREATE TABLE IF NOT EXISTS product_features (
+            product_id INTEGER PRIMARY KEY REFERENCES scraped_data (id) ON DELETE CASCADE,
+            category VARCHAR(100),
+            price NUMERIC(14, 2),
+            historical_price DOUBLE PRECISION NOT NULL,
+            price_tunisianet DOUBLE PRECISION NOT NULL,
+            price_mytech DOUBLE PRECISION NOT NULL,
+            historical_discount DOUBLE PRECISION NOT NULL,
+            price_diff_competitors DOUBLE PRECISION NOT NULL,
+            price_ratio_competitors DOUBLE PRECISION NOT NULL,
+            discount_impact DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Single definition of the features, shared by the trigger and
+        # feature_store.refresh_features. Same formulas as
+        # ModelTrainer.preprocess_input; missing competitor / historical
+        # prices fall back to the product price.
+        """
+        CREATE OR REPLACE VIEW product_features_source AS
+        SELECT
+            id AS product_id,
+            category,
+            price,
+            hp AS historical_price,
+            pt AS price_tunisianet,
+            pm AS price_mytech,
+            hd AS historical_discount,
+            pt - pm AS price_diff_competitors,
+            pt / COALESCE(NULLIF(pm, 0), 1) AS price_ratio_competitors,
+            hd * hp AS discount_impact
+        FROM (
+            SELECT
+                id, category, price,
+                COALESCE(historical_price, price, 0)::double precision AS hp,
+                COALESCE(price_tunisianet, price, 0)::double precision AS pt,
+                COALESCE(price_mytech, price, 0)::double precision AS pm,
+                COALESCE(historical_discount, 0)::double precision AS hd
+            FROM scraped_data
+        ) AS raw
+        """,
+        """
+        CREATE OR REPLACE FUNCTION refresh_product_features() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_features (
+                product_id, category, price, historical_price, price_tunisianet,
+                price_mytech, historical_discount, price_diff_competitors,
+                price_ratio_competitors, discount_impact, updated_at
+            )
+            SELECT src.*, CURRENT_TIMESTAMP
+            FROM product_features_source src
+            WHERE src.product_id = NEW.id
+            ON CONFLICT (product_id) DO UPDATE SET
+                category = EXCLUDED.category,
+                price = EXCLUDED.price,
+                historical_price = EXCLUDED.historical_price,
+                price_tunisianet = EXCLUDED.price_tunisianet,
+                price_mytech = EXCLUDED.price_mytech,
+                historical_discount = EXCLUDED.historical_discount,
+                price_diff_competitors = EXCLUDED.price_diff_competitors,
+                price_ratio_competitors = EXCLUDED.price_ratio_competitors,
+                discount_impact = EXCLUDED.discount_impact,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS scraped_data_features_refresh ON scraped_data",
+        # Only fires when a model input changes, not on title/description edits
+        """
+        CREATE TRIGGER scraped_data_features_refresh
+        AFTER INSERT OR UPDATE OF price, category, historical_price, price_tunisianet,
+            price_mytech, historical_discount
+        ON scraped_data
+        FOR EACH ROW EXECUTE FUNCTION refresh_product_features()
+        """,
+        # Backfill existing rows
+        """
+        INSERT INTO product_features (
+            product_id, category, price, historical_price, price_tunisianet,
+            price_mytech, historical_discount, price_diff_competitors,
+            price_ratio_competitors, discount_impact
+        )
+        SELECT * FROM product_features_source
+        ON CONFLICT (product_id) DO NOTHING
+        """,
+    ]),
+    (8, "price_history", [
+        # Append-only, monthly partitions. No FK so history outlives deletes.
+        """
+        CREATE TABLE IF NOT EXISTS price_history (
+            product_id INTEGER NOT NULL,
+            recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            price NUMERIC(14, 2),
+            price_tunisianet NUMERIC(14, 2),
+            price_mytech NUMERIC(14, 2)
+        ) PARTITION BY RANGE (recorded_at)
+        """,
+        "CREATE TABLE IF NOT EXISTS price_history_default PARTITION OF price_history DEFAULT",
+        "CREATE INDEX IF NOT EXISTS price_history_product_time_idx ON price_history (product_id, recorded_at)",
+        # Called by price_history.py maintain to keep partitions ahead of time
+        """
+        CREATE OR REPLACE FUNCTION price_history_ensure_partitions(months_ahead INTEGER) RETURNS void AS $$
+        DECLARE
+            month_start DATE;
+        BEGIN
+            FOR i IN 0..months_ahead LOOP
+                month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date;
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF price_history FOR VALUES FROM (%L) TO (%L)',
+                    'price_history_' || to_char(month_start, 'YYYY_MM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "SELECT price_history_ensure_partitions(12)",
+        # One row per actual change, whatever path wrote it (API, bulk, scraper)
+        """
+        CREATE OR REPLACE FUNCTION record_price_history() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT'
+                    OR NEW.price IS DISTINCT FROM OLD.price
+                    OR NEW.price_tunisianet IS DISTINCT FROM OLD.price_tunisianet
+                    OR NEW.price_mytech IS DISTINCT FROM OLD.price_mytech THEN
+                INSERT INTO price_history (product_id, price, price_tunisianet, price_mytech)
+                VALUES (NEW.id, NEW.price, NEW.price_tunisianet, NEW.price_mytech);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS scraped_data_price_history ON scraped_data",
+        """
+        CREATE TRIGGER scraped_data_price_history
+        AFTER INSERT OR UPDATE OF price, price_tunisianet, price_mytech
+        ON scraped_data
+        FOR EACH ROW EXECUTE FUNCTION record_price_history()
+        """,
+        # Seed with today's prices
+        """
+        INSERT INTO price_history (product_id, price, price_tunisianet, price_mytech)
+        SELECT id, price, price_tunisianet, price_mytech FROM scraped_data
+        """,
+        # Rolling aggregates for the model; refreshed by price_history.py maintain
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS price_history_rolling AS
+        SELECT
+            product_id,
+            AVG(price) FILTER (WHERE recorded_at >= now() - interval '7 days') AS avg_price_7d,
+            AVG(price) FILTER (WHERE recorded_at >= now() - interval '30 days') AS avg_price_30d,
+            MIN(price) FILTER (WHERE recorded_at >= now() - interval '30 days') AS min_price_30d,
+            MAX(price) FILTER (WHERE recorded_at >= now() - interval '30 days') AS max_price_30d,
+            STDDEV_SAMP(price) FILTER (WHERE recorded_at >= now() - interval '30 days') AS price_stddev_30d,
+            COUNT(*) FILTER (WHERE recorded_at >= now() - interval '30 days') AS changes_30d,
+            MAX(recorded_at) AS last_change_at
+        FROM price_history
+        WHERE recorded_at >= now() - interval '90 days'
+        GROUP BY product_id
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS price_history_rolling_product_idx ON price_history_rolling (product_id)",
+    ]),
+    (9, "scraped_data_content_hash", [
+        # Hash of the scraped columns; ingest.py compares incoming rows
+        # against it and skips the unchanged ones. Argument order must
+        # match INGEST_COLUMNS in ingest.py. 'v'/'n' prefixes keep NULL
+        # and '' apart.
+        """
+        CREATE OR REPLACE FUNCTION scraped_data_content_hash(
+            title TEXT, image_url TEXT, price NUMERIC, description TEXT, analysis TEXT,
+            season TEXT, category TEXT, historical_price NUMERIC, price_tunisianet NUMERIC,
+            price_mytech NUMERIC, historical_discount NUMERIC
+        ) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT md5(
+                coalesce('v' || title, 'n') || E'\\x1f' ||
+                coalesce('v' || image_url, 'n') || E'\\x1f' ||
+                coalesce('v' || price::text, 'n') || E'\\x1f' ||
+                coalesce('v' || description, 'n') || E'\\x1f' ||
+                coalesce('v' || analysis, 'n') || E'\\x1f' ||
+                coalesce('v' || season, 'n') || E'\\x1f' ||
+                coalesce('v' || category, 'n') || E'\\x1f' ||
+                coalesce('v' || historical_price::text, 'n') || E'\\x1f' ||
+                coalesce('v' || price_tunisianet::text, 'n') || E'\\x1f' ||
+                coalesce('v' || price_mytech::text, 'n') || E'\\x1f' ||
+                coalesce('v' || historical_discount::text, 'n')
+            )
+        $$
+        """,
+        # Generated, so API writes keep it current too; computed for
+        # existing rows when the column is added
+        """
+        ALTER TABLE scraped_data ADD COLUMN IF NOT EXISTS content_hash TEXT
+        GENERATED ALWAYS AS (scraped_data_content_hash(
+            title, image_url, price, description, analysis, season, category,
+            historical_price, price_tunisianet, price_mytech, historical_discount
+        )) STORED
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ingest_runs (
+            id BIGSERIAL PRIMARY KEY,
+            source TEXT,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            received INTEGER NOT NULL,
+            inserted INTEGER NOT NULL,
+            updated INTEGER NOT NULL,
+            unchanged INTEGER NOT NULL,
+            duplicates INTEGER NOT NULL,
+            invalid INTEGER NOT NULL
+        )
+        """,
+    ]),
+    (10, "ingest_runs_near_duplicates", [
+        # New titles skipped by ingest.py as near-duplicates (dedup.py)
+        "ALTER TABLE ingest_runs ADD COLUMN IF NOT EXISTS near_duplicates INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (11, "scraped_data_sort_indexes", [
+        # GET /products sorts on nullable keys: ORDER BY key ASC, id ASC and
+        # key DESC NULLS LAST, id DESC (NULLS LAST both ways), one index per
+        # direction; must match SORT_KEYS / NULLABLE_SORT_KEYS in api1.py.
+        # The ascending ones replace the single-column indexes of migration 5.
+        "CREATE INDEX IF NOT EXISTS scraped_data_price_id_idx ON scraped_data (price, id)",
+        "CREATE INDEX IF NOT EXISTS scraped_data_price_desc_id_idx ON scraped_data (price DESC NULLS LAST, id DESC)",
+        "CREATE INDEX IF NOT EXISTS scraped_data_category_id_idx ON scraped_data (category, id)",
+        "CREATE INDEX IF NOT EXISTS scraped_data_category_desc_id_idx ON scraped_data (category DESC NULLS LAST, id DESC)",
+        "CREATE INDEX IF NOT EXISTS scraped_data_delta_tunisianet_id_idx ON scraped_data ((price - price_tunisianet), id)",
+        """
+        CREATE INDEX IF NOT EXISTS scraped_data_delta_tunisianet_desc_id_idx
+        ON scraped_data ((price - price_tunisianet) DESC NULLS LAST, id DESC)
+        """,
+        "CREATE INDEX IF NOT EXISTS scraped_data_delta_mytech_id_idx ON scraped_data ((price - price_mytech), id)",
+        """
+        CREATE INDEX IF NOT EXISTS scraped_data_delta_mytech_desc_id_idx
+        ON scraped_data ((price - price_mytech) DESC NULLS LAST, id DESC)
+        """,
+        "DROP INDEX IF EXISTS scraped_data_price_idx",
+        "DROP INDEX IF EXISTS scraped_data_delta_tunisianet_idx",
+        "DROP INDEX IF EXISTS scraped_data_delta_mytech_idx",
+    ]),
+]
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def get_applied_versions(cur):
+    """Return the set of migration versions already applied"""
+    _ensure_migrations_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migrations(conn):
+    """Apply every pending migration in a single transaction.
+
+    Returns the list of versions applied by this call.
+    """
+    applied = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            done = get_applied_versions(cur)
+            for version, name, statements in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"Applying migration {version}: {name}")
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                applied.append(version)
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migration_status(conn):
+    """Return [(version, name, applied)] for every known migration"""
+    with conn.cursor() as cur:
+        done = get_applied_versions(cur)
+    conn.commit()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+def main(argv):
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        if '--status' in argv:
+            for version, name, is_applied in migration_status(conn):
+                print(f"  {version:>4}  {'applied' if is_applied else 'pending':<8} {name}")
+            return 0
+        applied = apply_migrations(conn)
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            print("Database schema is up to date")
+        return 0
+    except Exception as e:
+        print("Migration error:", str(e))
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,176 @@
+"""Postgres-backed queue for asynchronous price predictions.
+
+create_product can insert a product with its input price and enqueue a job
+instead of calling the model inline. Workers claim pending jobs with
+FOR UPDATE SKIP LOCKED, predict them as one batch and write the prices back
+in bulk. Jobs are deleted in the same transaction that stores the price, so
+a crashed worker simply leaves its jobs for the next one. A price set through
+the API in the meantime wins: its jobs are cancelled and the row is no longer
+'pending', which the write-back checks.
+
+The API starts PREDICTION_WORKERS worker threads with the first queued
+job (ensure_workers). Set PREDICTION_WORKERS=0 when standalone workers run
+instead:
+
+    python prediction_queue.py
+"""
+import os
+import threading
+import time
+import logging
+from psycopg2.extras import RealDictCursor, execute_values
+from db import get_db_connection
+from feature_store import predict_products
+
+logger = logging.getLogger(__name__)
+
+ASYNC_PREDICTIONS = os.getenv('ASYNC_PREDICTIONS', 'false').lower() in ('1', 'true', 'yes')
+PREDICTION_WORKERS = int(os.getenv('PREDICTION_WORKERS', '2'))
+PREDICTION_BATCH_SIZE = int(os.getenv('PREDICTION_BATCH_SIZE', '64'))
+PREDICTION_POLL_INTERVAL = float(os.getenv('PREDICTION_POLL_INTERVAL', '0.5'))
+
+PRICE_STATUS_PENDING = 'pending'
+PRICE_STATUS_PREDICTED = 'predicted'
+
+
+def enqueue_prediction(cur, product_id, category, input_price):
+    """Queue a prediction for `product_id` inside the caller's transaction"""
+    cur.execute("""
+        INSERT INTO prediction_jobs (product_id, category, input_price)
+        VALUES (%s, %s, %s)
+    """, (product_id, category, input_price))
+
+
+def cancel_predictions(cur, product_ids):
+    """Drop queued jobs for products whose price is being set explicitly.
+
+    Call before updating the rows: a job a worker has already claimed stays
+    locked until that worker commits, so this waits for it rather than
+    deadlocking with it on the product row.
+    """
+    cur.execute("DELETE FROM prediction_jobs WHERE product_id = ANY(%s)", (list(product_ids),))
+
+
+def cancel_matching_predictions(cur, where_sql, params):
+    """cancel_predictions for every product matching a scraped_data WHERE clause"""
+    cur.execute(f"""
+        DELETE FROM prediction_jobs
+        WHERE product_id IN (SELECT id FROM scraped_data {where_sql})
+    """, params)
+
+
+def process_batch(conn, batch_size=PREDICTION_BATCH_SIZE):
+    """Claim up to `batch_size` jobs, predict them and store the prices.
+
+    Returns the number of jobs processed.
+    """
+    # Imported lazily so the API process only loads the model when needed
+    from price_predictor import price_predictor
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, product_id, category, input_price
+                FROM prediction_jobs
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            jobs = cur.fetchall()
+            if not jobs:
+                conn.commit()
+                return 0
+
+            # The insert trigger has already materialized the features
+            prices = predict_products(conn, price_predictor, [
+                {'id': job['product_id'], 'category': job['category'], 'price': job['input_price']}
+                for job in jobs
+            ])
+
+            execute_values(cur, """
+                UPDATE scraped_data AS s
+                SET price = v.price, price_status = 'predicted'
+                FROM (VALUES %s) AS v(id, price)
+                WHERE s.id = v.id AND s.price_status = 'pending'
+            """, [
+                (job['product_id'], price) for job, price in zip(jobs, prices)
+            ], template="(%s::int, %s::numeric)", page_size=len(jobs))
+
+            cur.execute(
+                "DELETE FROM prediction_jobs WHERE id = ANY(%s)",
+                ([job['id'] for job in jobs],)
+            )
+        conn.commit()
+        return len(jobs)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class PredictionWorker(threading.Thread):
+    """Background thread that drains prediction_jobs in micro-batches"""
+
+    def __init__(self, batch_size=PREDICTION_BATCH_SIZE, poll_interval=PREDICTION_POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        conn = None
+        while not self._stop_event.is_set():
+            try:
+                if conn is None or conn.closed:
+                    conn = get_db_connection()
+                    if conn is None:
+                        self._stop_event.wait(self.poll_interval * 10)
+                        continue
+                processed = process_batch(conn, self.batch_size)
+                if processed:
+                    logger.info(f"Predicted prices for {processed} queued products")
+                    continue
+            except Exception as e:
+                logger.error(f"Prediction worker error: {str(e)}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+            self._stop_event.wait(self.poll_interval)
+        if conn is not None:
+            conn.close()
+
+
+def start_workers(count=PREDICTION_WORKERS):
+    """Start `count` prediction worker threads and return them"""
+    workers = [PredictionWorker() for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def ensure_workers(count=PREDICTION_WORKERS):
+    """Start the in-process workers once, so queued jobs have a consumer"""
+    if _workers or count <= 0:
+        return _workers
+    with _workers_lock:
+        if not _workers:
+            _workers.extend(start_workers(count))
+    return _workers
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Starting {PREDICTION_WORKERS} prediction workers...")
+    workers = start_workers()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,117 @@
+"""Price history queries and maintenance.
+
+price_history is append-only and filled by the scraped_data_price_history
+trigger (migration 8) whenever price or a competitor price changes.
+Run maintenance daily, e.g. from cron:
+
+    python price_history.py maintain
+
+It creates the coming months' partitions and refreshes the
+price_history_rolling aggregates (7/30-day price statistics per product).
+The price model does not read them yet; they are there for reporting and
+for future model features.
+"""
+import sys
+import datetime
+from db import get_db_connection
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+DEFAULT_RANGE_DAYS = 90
+MAX_RAW_POINTS = 1000
+PARTITION_MONTHS_AHEAD = 3
+
+
+def fetch_history(cur, product_id, start, end, bucket=None):
+    """Price points for one product in [start, end), oldest first.
+
+    Returns (points, truncated). Without a bucket the raw change events are
+    returned, the latest MAX_RAW_POINTS of them; truncated is True when
+    older ones were left out. With one, events are downsampled per bucket
+    into avg/min/max and the close price (the last change in the bucket).
+    """
+    if bucket is None:
+        cur.execute("""
+            SELECT recorded_at, price, price_tunisianet, price_mytech
+            FROM price_history
+            WHERE product_id = %s AND recorded_at >= %s AND recorded_at < %s
+            ORDER BY recorded_at DESC
+            LIMIT %s
+        """, (product_id, start, end, MAX_RAW_POINTS + 1))
+        points = cur.fetchall()
+        return points[:MAX_RAW_POINTS][::-1], len(points) > MAX_RAW_POINTS
+
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    cur.execute("""
+        SELECT
+            date_trunc(%s, recorded_at) AS bucket,
+            AVG(price) AS avg_price,
+            MIN(price) AS min_price,
+            MAX(price) AS max_price,
+            (array_agg(price ORDER BY recorded_at DESC))[1] AS close_price,
+            (array_agg(price_tunisianet ORDER BY recorded_at DESC))[1] AS close_price_tunisianet,
+            (array_agg(price_mytech ORDER BY recorded_at DESC))[1] AS close_price_mytech,
+            COUNT(*) AS changes
+        FROM price_history
+        WHERE product_id = %s AND recorded_at >= %s AND recorded_at < %s
+        GROUP BY 1
+        ORDER BY 1
+    """, (bucket, product_id, start, end))
+    return cur.fetchall(), False
+
+
+def _parse_timestamp(value):
+    """ISO timestamp as naive UTC (recorded_at is a UTC TIMESTAMP); naive input is taken as UTC"""
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_range(start_arg, end_arg):
+    """Parse ISO 'from' / 'to' query values; defaults to the last 90 days.
+
+    Both ends are returned as naive UTC, whether or not they carry an
+    offset ('2024-05-01T00:00:00Z', '...+01:00').
+    """
+    end = _parse_timestamp(end_arg) if end_arg else datetime.datetime.utcnow()
+    start = _parse_timestamp(start_arg) if start_arg else end - datetime.timedelta(days=DEFAULT_RANGE_DAYS)
+    if start >= end:
+        raise ValueError("'from' must be before 'to'")
+    return start, end
+
+
+def maintain(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Create upcoming partitions and refresh the rolling aggregates"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT price_history_ensure_partitions(%s)", (months_ahead,))
+            # CONCURRENTLY keeps the view readable while it refreshes
+            cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY price_history_rolling")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def main(argv):
+    if argv[:1] != ['maintain']:
+        print("Usage: python price_history.py maintain")
+        return 2
+    conn = get_db_connection(statement_timeout_ms=0)
+    if not conn:
+        print("Database connection failed")
+        return 1
+    try:
+        maintain(conn)
+        print("Price history partitions and rolling aggregates refreshed")
+        return 0
+    except Exception as e:
+        print("Price history maintenance error:", str(e))
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
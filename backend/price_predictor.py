@@ -67,6 +67,94 @@ class PricePredictor:
         except (ValueError, TypeError):
             return np.nan
 
+    def build_features(self, category='electronics', input_price=None):
+        """Return (base_price, features) for a single product"""
+        # Use input price as base if provided
+        base_price = self.clean_price(input_price) if input_price is not None else 1000.0
+
+        # Calculate competitor prices based on input price
+        tunisianet_price = base_price * 1.1  # 10% higher
+        mytech_price = base_price * 1.05    # 5% higher
+
+        features = {
+            'historical_price': base_price,
+            'price_tunisianet': tunisianet_price,
+            'price_mytech': mytech_price,
+            'historical_discount': 0.1,   # Default value
+            'price_diff_competitors': tunisianet_price - mytech_price,
+            'price_ratio_competitors': tunisianet_price / mytech_price,
+            'discount_impact': base_price * 0.1,  # 10% of base price
+            'category_encoded': self.label_encoder.fit_transform([category])[0]
+        }
+        return base_price, features
+
+    def apply_business_rules(self, predicted_price, base_price):
+        """Clamp a raw prediction to 80%-150% of the base price"""
+        if predicted_price < base_price * 0.8:  # Don't go below 80% of input price
+            predicted_price = base_price * 0.8
+        elif predicted_price > base_price * 1.5:  # Don't go above 150% of input price
+            predicted_price = base_price * 1.5
+
+        # Round to 2 decimal places
+        return round(predicted_price, 2)
+
+    def predict_prices(self, products):
+        """Predict prices for many products with a single model call.
+
+        `products` is a list of dicts with optional 'category' and 'price'
+        keys. Returns a list of prices in the same order; rows that cannot
+        be predicted fall back to their input price like predict_price.
+        """
+        if not products:
+            return []
+        base_prices = []
+        rows = []
+        for product in products:
+            base_price, features = self.build_features(
+                product.get('category') or 'electronics',
+                product.get('price')
+            )
+            base_prices.append(base_price)
+            rows.append(features)
+        try:
+            predictions = self.model.predict(pd.DataFrame(rows))
+            return [
+                self.apply_business_rules(float(predicted), base)
+                for predicted, base in zip(predictions, base_prices)
+            ]
+        except Exception as e:
+            logger.error(f"Error predicting price batch: {str(e)}")
+            return base_prices
+
+    def predict_from_features(self, rows):
+        """Predict prices from precomputed product_features rows.
+
+        Each row carries the stored features plus 'category' and 'price';
+        the business rules clamp around the stored price.
+        """
+        if not rows:
+            return []
+        base_prices = [self.clean_price(row['price']) if row.get('price') is not None else 1000.0 for row in rows]
+        features = pd.DataFrame([{
+            'historical_price': float(row['historical_price']),
+            'price_tunisianet': float(row['price_tunisianet']),
+            'price_mytech': float(row['price_mytech']),
+            'historical_discount': float(row['historical_discount']),
+            'price_diff_competitors': float(row['price_diff_competitors']),
+            'price_ratio_competitors': float(row['price_ratio_competitors']),
+            'discount_impact': float(row['discount_impact']),
+            'category_encoded': self.label_encoder.fit_transform([row.get('category') or 'electronics'])[0]
+        } for row in rows])
+        try:
+            predictions = self.model.predict(features)
+            return [
+                self.apply_business_rules(float(predicted), base)
+                for predicted, base in zip(predictions, base_prices)
+            ]
+        except Exception as e:
+            logger.error(f"Error predicting from stored features: {str(e)}")
+            return base_prices
+
     def predict_price(self, title, description, category='electronics', input_price=None):
         try:
             logger.info(f"Predicting price for: {title}")
@@ -74,24 +162,7 @@ class PricePredictor:
             logger.info(f"Category: {category}")
             logger.info(f"Input price: {input_price}")
             
-            # Use input price as base if provided
-            base_price = self.clean_price(input_price) if input_price is not None else 1000.0
-            
-            # Calculate competitor prices based on input price
-            tunisianet_price = base_price * 1.1  # 10% higher
-            mytech_price = base_price * 1.05    # 5% higher
-            
-            # Prepare features
-            features = {
-                'historical_price': base_price,
-                'price_tunisianet': tunisianet_price,
-                'price_mytech': mytech_price,
-                'historical_discount': 0.1,   # Default value
-                'price_diff_competitors': tunisianet_price - mytech_price,
-                'price_ratio_competitors': tunisianet_price / mytech_price,
-                'discount_impact': base_price * 0.1,  # 10% of base price
-                'category_encoded': self.label_encoder.fit_transform([category])[0]
-            }
+            base_price, features = self.build_features(category, input_price)
 
             # Log features for debugging
             logger.info(f"Features used for prediction: {json.dumps(features, indent=2)}")
@@ -104,13 +175,7 @@ class PricePredictor:
             logger.info(f"Raw predicted price: {predicted_price}")
 
             # Apply business rules
-            if predicted_price < base_price * 0.8:  # Don't go below 80% of input price
-                predicted_price = base_price * 0.8
-            elif predicted_price > base_price * 1.5:  # Don't go above 150% of input price
-                predicted_price = base_price * 1.5
-
-            # Round to 2 decimal places
-            final_price = round(predicted_price, 2)
+            final_price = self.apply_business_rules(predicted_price, base_price)
             logger.info(f"Final predicted price: {final_price}")
 
             return final_price
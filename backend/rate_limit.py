@@ -0,0 +1,234 @@
+"""Per-client rate limiting and per-route concurrency limits.
+
+Every request takes a token from a bucket keyed by (client, route). The
+client is the user of a valid bearer token, otherwise the remote address,
+so made-up tokens cannot be used to get fresh buckets.
+Expensive routes additionally hold a concurrency slot while they run; when
+no slot frees up within ADMISSION_WAIT_SECONDS the request is shed with 503
+instead of queuing behind the database or bcrypt.
+
+Buckets live in process memory. Set RATE_LIMIT_REDIS_URL (and install
+`redis`) to share them between workers.
+"""
+import os
+import time
+import threading
+import jwt
+from flask import request, jsonify, g, current_app
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL')
+ADMISSION_WAIT_SECONDS = float(os.getenv('ADMISSION_WAIT_SECONDS', '0.05'))
+# How often the memory store drops buckets that have refilled completely
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv('RATE_LIMIT_SWEEP_SECONDS', '60'))
+
+# endpoint -> (tokens per second, burst)
+DEFAULT_RATE_LIMIT = (20.0, 40)
+RATE_LIMITS = {
+    'login': (0.2, 5),
+    'register': (0.05, 3),
+    'search_products': (5.0, 20),
+    'export_products': (0.05, 2),
+    'bulk_update_products': (0.5, 5),
+    'bulk_delete_products': (0.5, 5),
+    'create_product': (5.0, 20),
+}
+
+# endpoint -> max requests in flight per process
+CONCURRENCY_LIMITS = {
+    'login': int(os.getenv('LOGIN_CONCURRENCY', '4')),
+    'register': int(os.getenv('LOGIN_CONCURRENCY', '4')),
+    'search_products': int(os.getenv('SEARCH_CONCURRENCY', '8')),
+    'export_products': int(os.getenv('EXPORT_CONCURRENCY', '2')),
+    'bulk_update_products': 2,
+    'bulk_delete_products': 2,
+    'create_product': int(os.getenv('CREATE_CONCURRENCY', '16')),
+}
+
+# Endpoints never limited (preflight, health probes, metrics scraping)
+EXEMPT_ENDPOINTS = {'login_options', 'health_check', 'rate_limit_metrics', 'static'}
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict; state is local to this process.
+
+    A bucket that has refilled to its burst is the same as no bucket, so
+    those are dropped every `sweep_interval` seconds.
+    """
+
+    def __init__(self, sweep_interval=RATE_LIMIT_SWEEP_SECONDS):
+        self._buckets = {}        # key -> (tokens, updated, full_at)
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def take(self, key, rate, burst):
+        """Take one token; returns (allowed, seconds until next token)"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep_locked(now)
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _sweep_locked(self, now):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._next_sweep = now + self.sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """Token buckets in Redis so every worker shares the same limits"""
+
+    SCRIPT = """
+        local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or ARGV[2])
+        local updated = tonumber(redis.call('HGET', KEYS[1], 'u') or ARGV[3])
+        tokens = math.min(tonumber(ARGV[2]), tokens + (tonumber(ARGV[3]) - updated) * tonumber(ARGV[1]))
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 't', tokens, 'u', ARGV[3])
+        redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2]) / tonumber(ARGV[1])) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'], args=[rate, burst, time.time()])
+        if int(allowed):
+            return True, 0.0
+        return False, (1 - float(tokens)) / rate
+
+
+class RateLimitMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def incr(self, endpoint, name):
+        with self._lock:
+            route = self.counters.setdefault(endpoint, {'allowed': 0, 'rate_limited': 0, 'shed': 0})
+            route[name] += 1
+
+    def snapshot(self, limiters):
+        with self._lock:
+            routes = {endpoint: dict(counts) for endpoint, counts in self.counters.items()}
+        for endpoint, limiter in limiters.items():
+            routes.setdefault(endpoint, {'allowed': 0, 'rate_limited': 0, 'shed': 0})
+            routes[endpoint]['in_flight'] = limiter.in_flight
+            routes[endpoint]['max_in_flight'] = limiter.limit
+        return routes
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        if not self._semaphore.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+def _make_store():
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+        except Exception as e:
+            print("Rate limit Redis backend unavailable, using memory:", str(e))
+    return MemoryBucketStore()
+
+
+store = _make_store()
+metrics = RateLimitMetrics()
+limiters = {endpoint: ConcurrencyLimiter(limit) for endpoint, limit in CONCURRENCY_LIMITS.items()}
+
+
+def client_key():
+    """'user:<id>' for a bearer token that verifies, else 'ip:<address>'"""
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer ') and len(auth) > 7:
+        try:
+            payload = jwt.decode(auth[7:], current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            if payload.get('user_id') is not None:
+                return f"user:{payload['user_id']}"
+        except jwt.InvalidTokenError:
+            pass
+    return 'ip:' + (request.remote_addr or 'unknown')
+
+
+def _reject(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def check_request():
+    """before_request hook: enforce the bucket, then take a concurrency slot"""
+    endpoint = request.endpoint
+    if not RATE_LIMIT_ENABLED or endpoint is None or endpoint in EXEMPT_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+
+    rate, burst = RATE_LIMITS.get(endpoint, DEFAULT_RATE_LIMIT)
+    try:
+        allowed, retry_after = store.take(f'{client_key()}:{endpoint}', rate, burst)
+    except Exception as e:
+        # A broken shared backend must not take the API down with it
+        print("Rate limit store error:", str(e))
+        allowed, retry_after = True, 0.0
+    if not allowed:
+        metrics.incr(endpoint, 'rate_limited')
+        return _reject(429, "Too many requests", retry_after)
+
+    limiter = limiters.get(endpoint)
+    if limiter is not None:
+        if not limiter.acquire(ADMISSION_WAIT_SECONDS):
+            metrics.incr(endpoint, 'shed')
+            return _reject(503, "Server busy, please retry", 1)
+        g.admission_limiter = limiter
+    metrics.incr(endpoint, 'allowed')
+    return None
+
+
+def release_request(exc=None):
+    """teardown_request hook; runs after streamed responses finish too"""
+    limiter = g.pop('admission_limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+
+def init_app(app):
+    app.before_request(check_request)
+    app.teardown_request(release_request)
+
+    @app.route('/metrics/rate-limits', methods=['GET'])
+    def rate_limit_metrics():
+        """Per-route allowed / rate-limited / shed counters and in-flight requests"""
+        return jsonify({
+            "backend": type(store).__name__,
+            "routes": metrics.snapshot(limiters)
+        })
@@ -0,0 +1,110 @@
+"""Response helpers: fast JSON, field projection, ETags and compression"""
+import datetime
+import gzip
+from decimal import Decimal
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 500
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+PRODUCT_FIELDS = [
+    'id', 'title', 'description', 'price', 'category', 'image_url',
+    'historical_price', 'price_tunisianet', 'price_mytech', 'historical_discount',
+    'price_status'
+]
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson when it is installed"""
+
+    # Compact output even in debug mode; indentation doubles payload size
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def parse_fields(default_fields, allowed_fields=PRODUCT_FIELDS):
+    """Return the column list requested with ?fields=a,b,c.
+
+    Raises ValueError for unknown columns so they never reach the SQL.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default_fields)
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in allowed_fields:
+            raise ValueError(f"Unknown field: {field}")
+        if field not in fields:
+            fields.append(field)
+    if not fields:
+        raise ValueError("fields must name at least one column")
+    return fields
+
+
+def conditional_response(response):
+    """Attach a weak ETag and answer 304 when If-None-Match matches"""
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
+
+
+def compress_response(response):
+    """after_request hook: gzip / brotli encode buffered text responses"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    accept = request.headers.get('Accept-Encoding', '').lower()
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    if brotli is not None and 'br' in accept:
+        response.set_data(brotli.compress(data, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accept:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
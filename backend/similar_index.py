@@ -0,0 +1,326 @@
+"""In-memory nearest-neighbour index for /products/<id>/similar.
+
+Every product is a sparse, L2-normalized TF-IDF vector over its title
+words plus its description words (weighted by SIMILAR_DESCRIPTION_WEIGHT),
+a log price and a category code. Two products score
+
+    SIMILAR_TEXT_WEIGHT * cosine of the TF-IDF vectors
+    + SIMILAR_PRICE_WEIGHT * max(0, 1 - |log price gap| / SIMILAR_PRICE_SCALE)
+    + SIMILAR_CATEGORY_WEIGHT * (same category)
+
+A query only reads the posting columns of its own terms (CSC slicing) and
+scores price and category for all rows with NumPy, then takes the top k
+with argpartition, so it stays in the low milliseconds on catalogs of
+hundreds of thousands of rows.
+
+Writes go to a small pending block that is scored next to the base matrix
+(vocabulary and IDF come from the last full build; new words are ignored
+until then). When it grows past SIMILAR_MAX_PENDING rows, the build is
+older than SIMILAR_REFRESH_SECONDS or invalidate() was called, the base is
+rebuilt in the background while the current one keeps answering; writes
+made during the rebuild are applied on top of its result.
+numpy and scipy are imported on first use to keep api1 import time low.
+"""
+import os
+import math
+import time
+import threading
+from collections import Counter
+from psycopg2.extras import RealDictCursor
+from suggest_index import normalize
+
+SIMILAR_TEXT_WEIGHT = float(os.getenv('SIMILAR_TEXT_WEIGHT', '0.7'))
+SIMILAR_PRICE_WEIGHT = float(os.getenv('SIMILAR_PRICE_WEIGHT', '0.2'))
+SIMILAR_CATEGORY_WEIGHT = float(os.getenv('SIMILAR_CATEGORY_WEIGHT', '0.1'))
+SIMILAR_DESCRIPTION_WEIGHT = float(os.getenv('SIMILAR_DESCRIPTION_WEIGHT', '0.5'))
+# Log price gap at which price closeness reaches 0 (1.0 is about 2.7x)
+SIMILAR_PRICE_SCALE = float(os.getenv('SIMILAR_PRICE_SCALE', '1.0'))
+SIMILAR_MAX_PENDING = int(os.getenv('SIMILAR_MAX_PENDING', '2000'))
+SIMILAR_REFRESH_SECONDS = float(os.getenv('SIMILAR_REFRESH_SECONDS', '900'))
+
+PRODUCT_KEYS = ('id', 'title', 'description', 'price', 'category')
+
+
+def _term_counts(product):
+    counts = Counter(normalize(product.get('title')).split())
+    description = normalize(product.get('description')).split()
+    for term, n in Counter(description).items():
+        counts[term] += SIMILAR_DESCRIPTION_WEIGHT * n
+    counts.pop('', None)
+    return counts
+
+
+def _log_price(price):
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return math.nan
+    return math.log1p(price) if price >= 0 else math.nan
+
+
+class _Vocabulary:
+    """Term columns and smoothed IDF weights of one full build"""
+
+    def __init__(self, documents):
+        import numpy as np
+        df = Counter()
+        for counts in documents:
+            df.update(counts.keys())
+        self.columns = {term: i for i, term in enumerate(sorted(df))}
+        n = len(documents)
+        self.idf = np.ones(len(self.columns), dtype=np.float64)
+        for term, i in self.columns.items():
+            self.idf[i] = math.log((1 + n) / (1 + df[term])) + 1
+
+    def vectorize(self, documents):
+        """CSR matrix with one L2-normalized TF-IDF row per document"""
+        import numpy as np
+        from scipy import sparse
+        indptr, indices, data = [0], [], []
+        for counts in documents:
+            for term, n in counts.items():
+                i = self.columns.get(term)
+                if i is not None:
+                    indices.append(i)
+                    # Sublinear tf so a repeated word does not dominate
+                    data.append(1 + math.log(n) if n >= 1 else n)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(documents), len(self.columns))
+        )
+        matrix = matrix.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ matrix
+
+
+class _Block:
+    """Vectors and metadata for a fixed set of products"""
+
+    def __init__(self, products, vocabulary, categories, documents=None):
+        import numpy as np
+        self.products = products
+        self.rows = {p['id']: i for i, p in enumerate(products)}
+        if documents is None:
+            documents = [_term_counts(p) for p in products]
+        self.vectors = vocabulary.vectorize(documents)
+        # CSC copy so a query reads only the columns of its own terms
+        self.text = self.vectors.tocsc()
+        self.log_price = np.array([_log_price(p.get('price')) for p in products], dtype=np.float64)
+        self.category = np.array([categories.code(p.get('category')) for p in products], dtype=np.int32)
+        self.alive = np.ones(len(products), dtype=bool)
+
+    def query_vector(self, row):
+        start, end = self.vectors.indptr[row], self.vectors.indptr[row + 1]
+        return self.vectors.indices[start:end], self.vectors.data[start:end]
+
+    def scores(self, terms, weights, log_price, category):
+        import numpy as np
+        if len(terms):
+            text = self.text[:, terms] @ weights
+        else:
+            text = np.zeros(len(self.products))
+        gap = np.abs(self.log_price - log_price)
+        price = np.clip(1 - gap / SIMILAR_PRICE_SCALE, 0, 1)
+        price[np.isnan(price)] = 0
+        same_category = (self.category == category) & (category >= 0)
+        scores = (SIMILAR_TEXT_WEIGHT * text
+                  + SIMILAR_PRICE_WEIGHT * price
+                  + SIMILAR_CATEGORY_WEIGHT * same_category)
+        scores[~self.alive] = -np.inf
+        return scores
+
+
+class _Categories:
+    def __init__(self):
+        self._codes = {}
+
+    def code(self, category):
+        if not category:
+            return -1
+        return self._codes.setdefault(category, len(self._codes))
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self._base = None
+        self._vocabulary = None
+        self._categories = _Categories()
+        self._pending = {}        # product_id -> (seq, product or None if deleted)
+        self._pending_block = None
+        self._seq = 0
+        self._invalidated_seq = 0
+        self._loaded_seq = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._loaded_at = None
+
+    def load(self, products, start_seq=None):
+        """Replace the index with product dicts (id, title, description, price, category).
+
+        Pending writes newer than `start_seq` (taken before the rows were
+        read) are kept on top of the new base.
+        """
+        if start_seq is None:
+            start_seq = self._seq
+        products = [dict(p) for p in products]
+        documents = [_term_counts(p) for p in products]
+        categories = _Categories()
+        vocabulary = _Vocabulary(documents)
+        base = _Block(products, vocabulary, categories, documents)
+        with self._lock:
+            # Keep writes made while the build was reading the table
+            self._pending = {pid: entry for pid, entry in self._pending.items() if entry[0] > start_seq}
+            for product_id, (seq, product) in self._pending.items():
+                row = base.rows.get(product_id)
+                if row is not None:
+                    base.alive[row] = False
+                    if product is not None:
+                        # Partial updates recorded before the first build
+                        self._pending[product_id] = (seq, {**base.products[row], **product})
+            self._base, self._vocabulary, self._categories = base, vocabulary, categories
+            self._pending_block = None
+            self._loaded_seq = start_seq
+            self._loaded_at = time.monotonic()
+
+    def load_from_db(self, conn):
+        start_seq = self._seq
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"SELECT {', '.join(PRODUCT_KEYS)} FROM scraped_data WHERE title IS NOT NULL")
+            self.load(cur.fetchall(), start_seq)
+
+    def _is_fresh(self):
+        loaded_at = self._loaded_at
+        return (loaded_at is not None
+                and time.monotonic() - loaded_at < SIMILAR_REFRESH_SECONDS
+                and len(self._pending) <= SIMILAR_MAX_PENDING
+                and self._invalidated_seq <= self._loaded_seq)
+
+    def _rebuild(self, connect):
+        with self._build_lock:
+            if self._is_fresh():
+                return
+            conn = connect()
+            if not conn:
+                return
+            try:
+                self.load_from_db(conn)
+            finally:
+                conn.close()
+
+    def ensure_loaded(self, connect):
+        """Block for the first build; later rebuilds run in the background.
+
+        Returns True when an index is available.
+        """
+        if self._loaded_at is None:
+            self._rebuild(connect)
+        elif not self._is_fresh() and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+        return self._loaded_at is not None
+
+    def warm(self, connect):
+        """Build in the background (server start)"""
+        if self._loaded_at is None and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+
+    def invalidate(self):
+        """Rebuild in the background on the next lookup (after set-based writes)"""
+        with self._lock:
+            self._seq += 1
+            self._invalidated_seq = self._seq
+
+    def add(self, product_id, fields):
+        """Record a created or updated product.
+
+        `fields` may be partial (e.g. an update without category); missing
+        keys keep their indexed values.
+        """
+        with self._lock:
+            if not self._tracking_locked():
+                return
+            product = dict(self._get_locked(product_id) or {'id': product_id})
+            product.update({key: fields[key] for key in PRODUCT_KEYS if key in fields})
+            product['id'] = product_id
+            self._set_pending_locked(product_id, product)
+
+    def remove(self, product_id):
+        with self._lock:
+            if not self._tracking_locked():
+                return
+            self._set_pending_locked(product_id, None)
+
+    def _tracking_locked(self):
+        # Before the first build, writes only matter to a build in progress
+        return self._base is not None or self._build_lock.locked()
+
+    def _set_pending_locked(self, product_id, product):
+        self._seq += 1
+        self._pending[product_id] = (self._seq, product)
+        self._pending_block = None
+        row = self._base.rows.get(product_id) if self._base is not None else None
+        if row is not None:
+            self._base.alive[row] = False
+
+    def _get_locked(self, product_id):
+        if product_id in self._pending:
+            return self._pending[product_id][1]
+        row = self._base.rows.get(product_id) if self._base is not None else None
+        return self._base.products[row] if row is not None else None
+
+    def _pending_block_locked(self):
+        if self._pending_block is None:
+            products = [product for _, product in self._pending.values() if product is not None]
+            self._pending_block = _Block(products, self._vocabulary, self._categories)
+        return self._pending_block
+
+    def similar(self, product_id, limit=10):
+        """Return up to `limit` {id, title, price, category, score}, best first.
+
+        Returns None when the product is not in the index.
+        """
+        import numpy as np
+        with self._lock:
+            if self._base is None:
+                return None
+            pending = self._pending_block_locked()
+            if product_id in pending.rows:
+                source, row = pending, pending.rows[product_id]
+            elif self._base.rows.get(product_id) is not None and self._base.alive[self._base.rows[product_id]]:
+                source, row = self._base, self._base.rows[product_id]
+            else:
+                return None
+            terms, weights = source.query_vector(row)
+            log_price = source.log_price[row]
+            category = source.category[row]
+
+            candidates = []
+            for block in (self._base, pending):
+                if not len(block.products):
+                    continue
+                scores = block.scores(terms, weights, log_price, category)
+                own = block.rows.get(product_id)
+                if own is not None:
+                    scores[own] = -np.inf
+                k = min(limit, len(scores))
+                top = np.argpartition(-scores, k - 1)[:k]
+                for i in top:
+                    if np.isfinite(scores[i]):
+                        candidates.append((float(scores[i]), block.products[i]))
+
+        candidates.sort(key=lambda c: (-c[0], c[1]['id']))
+        return [{
+            "id": product['id'],
+            "title": product.get('title'),
+            "price": product.get('price'),
+            "category": product.get('category'),
+            "score": round(score, 4)
+        } for score, product in candidates[:limit]]
+
+    def __len__(self):
+        base = int(self._base.alive.sum()) if self._base is not None else 0
+        return base + sum(1 for _, product in self._pending.values() if product is not None)
+
+
+similar_index = SimilarityIndex()
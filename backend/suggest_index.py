@@ -0,0 +1,189 @@
+"""In-memory prefix index over product titles for /products/suggest.
+
+Each title is stored once per word start (up to SUGGEST_MAX_WORDS words),
+as a normalized key truncated to SUGGEST_KEY_LENGTH characters, in one
+sorted list. A prefix lookup is a bisect plus a short forward scan, so
+"jbl tour" matches "ECOUTEUR Sans Fil JBL Tour Pro 3 BEIGE" without
+touching the database.
+
+Only the first build blocks a request. Refreshes (every
+SUGGEST_REFRESH_SECONDS, or after invalidate()) run in the background
+while the current index keeps answering, and writes made during a rebuild
+are applied on top of its result.
+"""
+import os
+import re
+import time
+import bisect
+import threading
+import unicodedata
+from psycopg2.extras import RealDictCursor
+
+SUGGEST_MAX_WORDS = int(os.getenv('SUGGEST_MAX_WORDS', '8'))
+SUGGEST_KEY_LENGTH = int(os.getenv('SUGGEST_KEY_LENGTH', '48'))
+# Rebuild periodically so other worker processes' writes show up
+SUGGEST_REFRESH_SECONDS = float(os.getenv('SUGGEST_REFRESH_SECONDS', '300'))
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+class TitleIndex:
+    def __init__(self):
+        self._keys = []      # sorted (key, product_id)
+        self._titles = {}    # product_id -> title
+        self._writes = {}    # product_id -> (seq, title or None if removed)
+        self._seq = 0
+        self._invalidated_seq = 0
+        self._loaded_seq = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._loaded_at = None
+
+    def _entries(self, product_id, title):
+        words = normalize(title).split(' ')
+        entries = set()
+        for i in range(min(len(words), SUGGEST_MAX_WORDS)):
+            key = ' '.join(words[i:])[:SUGGEST_KEY_LENGTH]
+            if key:
+                entries.add((key, product_id))
+        return entries
+
+    def load(self, rows, start_seq=None):
+        """Replace the index with (id, title) rows.
+
+        Writes newer than `start_seq` (taken before the rows were read) are
+        kept on top of the new index.
+        """
+        if start_seq is None:
+            start_seq = self._seq
+        keys = []
+        titles = {}
+        for product_id, title in rows:
+            titles[product_id] = title
+            keys.extend(self._entries(product_id, title))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._titles = titles
+            # Keep writes made while the build was reading the table
+            self._writes = {pid: entry for pid, entry in self._writes.items() if entry[0] > start_seq}
+            for product_id, (_, title) in self._writes.items():
+                self._remove_locked(product_id)
+                if title is not None:
+                    self._insert_locked(product_id, title)
+            self._loaded_seq = start_seq
+            self._loaded_at = time.monotonic()
+
+    def load_from_db(self, conn):
+        start_seq = self._seq
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT id, title FROM scraped_data WHERE title IS NOT NULL")
+            self.load(((row['id'], row['title']) for row in cur.fetchall()), start_seq)
+
+    def _is_fresh(self):
+        loaded_at = self._loaded_at
+        return (loaded_at is not None
+                and time.monotonic() - loaded_at < SUGGEST_REFRESH_SECONDS
+                and self._invalidated_seq <= self._loaded_seq)
+
+    def _rebuild(self, connect):
+        with self._build_lock:
+            # Another thread may have rebuilt while we waited
+            if self._is_fresh():
+                return
+            conn = connect()
+            if not conn:
+                return
+            try:
+                self.load_from_db(conn)
+            finally:
+                conn.close()
+
+    def ensure_loaded(self, connect):
+        """Block for the first build; later rebuilds run in the background.
+
+        Returns True when an index is available.
+        """
+        if self._loaded_at is None:
+            self._rebuild(connect)
+        elif not self._is_fresh() and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+        return self._loaded_at is not None
+
+    def warm(self, connect):
+        """Build in the background (server start)"""
+        if self._loaded_at is None and not self._build_lock.locked():
+            threading.Thread(target=self._rebuild, args=(connect,), daemon=True).start()
+
+    def invalidate(self):
+        """Rebuild in the background on the next lookup (after set-based writes)"""
+        with self._lock:
+            self._seq += 1
+            self._invalidated_seq = self._seq
+
+    def add(self, product_id, title):
+        with self._lock:
+            self._record_locked(product_id, title)
+            if self._loaded_at is None:
+                return
+            self._remove_locked(product_id)
+            self._insert_locked(product_id, title)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._record_locked(product_id, None)
+            self._remove_locked(product_id)
+
+    def _record_locked(self, product_id, title):
+        # Only needed by a build in progress, which re-applies them
+        if self._build_lock.locked():
+            self._seq += 1
+            self._writes[product_id] = (self._seq, title)
+
+    def _insert_locked(self, product_id, title):
+        self._titles[product_id] = title
+        for entry in self._entries(product_id, title):
+            bisect.insort(self._keys, entry)
+
+    def _remove_locked(self, product_id):
+        title = self._titles.pop(product_id, None)
+        if title is None:
+            return
+        for entry in self._entries(product_id, title):
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` {id, title} dicts whose words start with prefix"""
+        prefix = normalize(prefix)[:SUGGEST_KEY_LENGTH]
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, product_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    results.append({"id": product_id, "title": self._titles[product_id]})
+                i += 1
+        return results
+
+    def __len__(self):
+        return len(self._titles)
+
+
+title_index = TitleIndex()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules (api1.py is run
+# from this directory)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
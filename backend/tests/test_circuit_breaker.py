@@ -0,0 +1,99 @@
+import pytest
+import db
+from db import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db.time, 'monotonic', clock)
+    return clock
+
+
+def make_breaker():
+    return CircuitBreaker(failure_rate=0.5, min_calls=4, window_seconds=10, open_seconds=5)
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_opens_at_failure_rate(clock):
+    breaker = make_breaker()
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert not breaker.available()
+    assert breaker.retry_after() == 5
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 11
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['recent_calls'] == 1
+
+
+def trip(breaker):
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 5
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    assert not breaker.available()
+
+
+def test_probe_success_closes(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot() == {"state": "closed", "recent_calls": 1, "recent_failures": 0, "retry_after": 0}
+
+
+def test_probe_failure_reopens(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_lost_probe_is_retried(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 5
+    assert breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
@@ -0,0 +1,104 @@
+from dedup import NearDuplicateIndex, signature, similarity, variant_tokens, shingles, NUM_PERM
+
+
+def test_signature_is_stable():
+    sig = signature('Smartphone Samsung Galaxy A15 4Go 128Go Noir')
+    assert len(sig) == NUM_PERM
+    assert sig == signature('SMARTPHONE  samsung galaxy a15 4go 128go noir')
+    assert signature('') is None
+    assert shingles('abc') == {'abc'}
+
+
+def test_similarity_estimates_jaccard():
+    a = signature('Smartphone Samsung Galaxy A15 4Go 128Go Noir')
+    assert similarity(a, a) == 1.0
+    assert similarity(a, signature('Smartphone Samsung Galaxy A15 4Go 128Go - Noir')) >= 0.8
+    assert similarity(a, signature('Clavier Logitech K120 USB')) < 0.3
+
+
+def test_variant_tokens():
+    assert variant_tokens('Galaxy A15 4Go Noir') == {'15', '4', 'noir'}
+    assert variant_tokens('JBL Tour Pro3 BEIGE') == variant_tokens('JBL Tour Pro 3 beige') == {'3', 'beige'}
+    assert variant_tokens('Clavier Logitech') == frozenset()
+
+
+def test_spacing_of_numbers_still_matches():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.load([(1, 'ECOUTEUR Sans Fil JBL Tour Pro 3 BEIGE')])
+    assert [m['id'] for m in index.find('ECOUTEUR Sans Fil JBL Tour Pro3 BEIGE')] == [1]
+    assert index.find('ECOUTEUR Sans Fil JBL Tour Pro 2 BEIGE') == []
+
+
+def make_index():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.load([
+        (1, 'Smartphone Samsung Galaxy A15 4Go 128Go Noir'),
+        (2, 'Clavier Logitech K120 USB'),
+    ])
+    return index
+
+
+def test_find_near_duplicate():
+    index = make_index()
+    matches = index.find('Smartphone Samsung Galaxy A15 4Go 128Go - Noir')
+    assert [m['id'] for m in matches] == [1]
+    assert index.find('Smartphone Samsung Galaxy A15 4Go 128Go Noir', exclude_id=1) == []
+
+
+def test_variants_are_not_duplicates():
+    index = make_index()
+    assert index.find('Smartphone Samsung Galaxy A25 4Go 128Go Noir') == []
+    assert index.find('Smartphone Samsung Galaxy A15 4Go 128Go Bleu') == []
+
+
+def test_add_and_remove():
+    index = make_index()
+    index._loaded_at = 0
+    index.add(3, 'Souris Logitech M185 sans fil')
+    assert [m['id'] for m in index.find('Souris Logitech M185 sans fil!')] == [3]
+    index.remove(3)
+    assert index.find('Souris Logitech M185 sans fil!') == []
+
+
+def test_find_batch_checks_earlier_rows():
+    index = make_index()
+    results = index.find_batch([
+        'Souris Logitech M185 sans fil',
+        'Souris Logitech M185 - sans fil',
+        'Smartphone Samsung Galaxy A15 4Go 128Go Noir',
+    ])
+    assert results[0] == []
+    assert [m.get('batch_index') for m in results[1]] == [0]
+    assert [m.get('id') for m in results[2]] == [1]
+
+
+def test_duplicate_pairs_keep_oldest():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.load([
+        (5, 'Clavier Logitech K120 USB'),
+        (9, 'Clavier Logitech K120 - USB'),
+        (7, 'Clavier  Logitech K120 USB!'),
+        (8, 'Souris Logitech M185'),
+    ])
+    assert sorted((keep, drop) for keep, drop, _ in index.duplicate_pairs()) == [(5, 7), (5, 9)]
+
+
+def test_invalidate_keeps_serving():
+    index = make_index()
+    index.invalidate()
+    assert not index._is_fresh()
+    assert [m['id'] for m in index.find('Clavier Logitech K120 - USB')] == [2]
+    assert index.warm(lambda: None)
+
+
+def test_writes_during_a_build_survive_it():
+    index = make_index()
+    start_seq = index._seq
+    with index._build_lock:
+        index.add(3, 'Souris Logitech M185 sans fil')
+        index.remove(2)
+        # Rows read before those writes
+        index.load([(1, 'Smartphone Samsung Galaxy A15 4Go 128Go Noir'), (2, 'Clavier Logitech K120 USB')], start_seq)
+    assert [m['id'] for m in index.find('Souris Logitech M185 - sans fil')] == [3]
+    assert index.find('Clavier Logitech K120 - USB') == []
+    assert index._is_fresh()
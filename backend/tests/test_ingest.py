@@ -0,0 +1,28 @@
+from decimal import Decimal
+from ingest import _clean, _parse_price
+
+
+def test_parse_scraper_prices():
+    assert _parse_price('1\xa0049,000 DT', 12) == Decimal('1049000')
+    assert _parse_price('159046.99', 12) == Decimal('159046.99')
+    assert _parse_price(250000, 12) == 250000
+    assert _parse_price('Prix non disponible', 12) is None
+    assert _parse_price('1.2.3', 12) is None
+    assert _parse_price(float('nan'), 12) is None
+    assert _parse_price(True, 12) is None
+    assert _parse_price('1500', 3) is None
+
+
+def test_clean_row():
+    row = _clean({
+        'title': 'Clavier Logitech K120', 'price': '35,000 DT', 'historical_discount': '0.00',
+        'price_mytech': '', 'price_tunisianet': 'NULL', 'user_id': 'NULL'
+    })
+    assert row == {
+        'title': 'Clavier Logitech K120', 'price': Decimal('35000'),
+        'historical_discount': Decimal('0.00'), 'price_mytech': None, 'price_tunisianet': None
+    }
+
+
+def test_unparseable_price_rejects_row():
+    assert _clean({'title': 'Clavier Logitech K120', 'price': 'sur commande'}) is None
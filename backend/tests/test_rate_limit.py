@@ -0,0 +1,84 @@
+import jwt
+import pytest
+from flask import Flask
+import rate_limit
+from rate_limit import MemoryBucketStore, client_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_then_refill(clock):
+    store = MemoryBucketStore()
+    for _ in range(3):
+        assert store.take('ip:a', rate=2.0, burst=3) == (True, 0.0)
+    allowed, retry_after = store.take('ip:a', rate=2.0, burst=3)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+    clock.now += 0.5
+    assert store.take('ip:a', rate=2.0, burst=3)[0]
+
+
+def test_buckets_are_per_key(clock):
+    store = MemoryBucketStore()
+    assert store.take('ip:a', rate=1.0, burst=1)[0]
+    assert not store.take('ip:a', rate=1.0, burst=1)[0]
+    assert store.take('ip:b', rate=1.0, burst=1)[0]
+
+
+def test_refill_stops_at_burst(clock):
+    store = MemoryBucketStore()
+    store.take('ip:a', rate=1.0, burst=2)
+    clock.now += 100
+    assert store.take('ip:a', rate=1.0, burst=2)[0]
+    assert store.take('ip:a', rate=1.0, burst=2)[0]
+    assert not store.take('ip:a', rate=1.0, burst=2)[0]
+
+
+def test_sweep_drops_full_buckets(clock):
+    store = MemoryBucketStore(sweep_interval=60)
+    store.take('ip:idle', rate=1.0, burst=5)
+    clock.now += 30
+    store.take('ip:busy', rate=0.01, burst=5)
+    assert len(store) == 2
+    clock.now += 30
+    store.take('ip:new', rate=1.0, burst=5)
+    # ip:idle refilled long ago; ip:busy needs 100s more to be full
+    assert len(store) == 2
+    assert 'ip:idle' not in store._buckets
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'rate-limit-test-secret-0123456789abcdef'
+    return app
+
+
+def test_client_key_uses_verified_user(app):
+    token = jwt.encode({'user_id': 7}, 'rate-limit-test-secret-0123456789abcdef', algorithm='HS256')
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert client_key() == 'user:7'
+
+
+def test_client_key_ignores_forged_token(app):
+    token = jwt.encode({'user_id': 7}, 'another-test-secret-0123456789abcdef', algorithm='HS256')
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert client_key() == 'ip:10.0.0.1'
+
+
+def test_client_key_without_token(app):
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        assert client_key() == 'ip:10.0.0.2'
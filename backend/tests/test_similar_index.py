@@ -0,0 +1,86 @@
+from similar_index import SimilarityIndex
+
+PRODUCTS = [
+    {'id': 1, 'title': 'Ecouteurs JBL Tune 520BT', 'description': 'casque bluetooth', 'price': 150000, 'category': 'audio'},
+    {'id': 2, 'title': 'Ecouteurs JBL Tune 720BT', 'description': 'casque bluetooth', 'price': 220000, 'category': 'audio'},
+    {'id': 3, 'title': 'Casque Sony WH-1000XM5', 'description': 'casque bluetooth', 'price': 1200000, 'category': 'audio'},
+    {'id': 4, 'title': 'Clavier Logitech K120', 'description': 'clavier usb', 'price': 30000, 'category': 'peripheriques'},
+]
+
+
+def make_index():
+    index = SimilarityIndex()
+    index.load(PRODUCTS)
+    return index
+
+
+def ids(results):
+    return [r['id'] for r in results]
+
+
+def test_ranks_closest_first_and_excludes_self():
+    results = make_index().similar(1, limit=3)
+    assert ids(results) == [2, 3, 4]
+    assert results[0]['score'] > results[1]['score'] > results[2]['score']
+    assert set(results[0]) == {'id', 'title', 'price', 'category', 'score'}
+
+
+def test_limit_and_unknown_product():
+    index = make_index()
+    assert ids(index.similar(1, limit=1)) == [2]
+    assert index.similar(99) is None
+    assert SimilarityIndex().similar(1) is None
+
+
+def test_pending_writes():
+    index = make_index()
+    index.add(5, {'title': 'Ecouteurs JBL Tune 520BT Blanc', 'description': 'casque bluetooth', 'price': 155000, 'category': 'audio'})
+    assert ids(index.similar(1, limit=1)) == [5]
+    assert ids(index.similar(5, limit=1)) == [1]
+    # Partial update keeps the indexed fields
+    index.add(2, {'price': 160000})
+    assert index._get_locked(2)['title'] == 'Ecouteurs JBL Tune 720BT'
+    index.remove(5)
+    assert index.similar(5) is None
+    assert 5 not in ids(index.similar(1))
+    assert len(index) == 4
+
+
+def test_load_keeps_newer_writes():
+    index = make_index()
+    start_seq = index._seq
+    index.remove(4)
+    index.load(PRODUCTS, start_seq)
+    assert index.similar(4) is None
+    assert len(index) == 3
+
+
+def test_invalidate_keeps_serving_and_recording():
+    index = make_index()
+    index.invalidate()
+    assert not index._is_fresh()
+    assert ids(index.similar(1, limit=1)) == [2]
+    index.add(5, {'title': 'Ecouteurs JBL Tune 520BT Blanc', 'description': 'casque bluetooth', 'price': 155000, 'category': 'audio'})
+    assert ids(index.similar(1, limit=1)) == [5]
+    # A rebuild that read the table before the write keeps it
+    start_seq = index._seq - 1
+    index.load(PRODUCTS, start_seq)
+    assert index._is_fresh()
+    assert ids(index.similar(1, limit=1)) == [5]
+
+
+def test_stale_index_answers_when_database_is_down():
+    index = make_index()
+    index.invalidate()
+    assert index.ensure_loaded(lambda: None)
+    assert ids(index.similar(1, limit=1)) == [2]
+
+
+def test_writes_during_first_build_are_kept():
+    index = SimilarityIndex()
+    with index._build_lock:
+        start_seq = index._seq
+        index.add(2, {'price': 500000})
+        index.load(PRODUCTS, start_seq)
+    assert index._get_locked(2)['title'] == 'Ecouteurs JBL Tune 720BT'
+    assert index._get_locked(2)['price'] == 500000
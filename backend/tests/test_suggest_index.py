@@ -0,0 +1,70 @@
+from suggest_index import TitleIndex, normalize
+
+
+def titles(results):
+    return [r['title'] for r in results]
+
+
+def make_index():
+    index = TitleIndex()
+    index.load([
+        (1, 'ECOUTEUR Sans Fil JBL Tour Pro 3 BEIGE'),
+        (2, 'Écouteurs JBL Tune 520BT'),
+        (3, 'Clavier Logitech K120'),
+    ])
+    return index
+
+
+def test_normalize():
+    assert normalize('Écouteur  Sans-Fil (JBL)') == 'ecouteur sans fil jbl'
+    assert normalize(None) == ''
+
+
+def test_matches_any_word_start():
+    index = make_index()
+    assert titles(index.suggest('jbl tour')) == ['ECOUTEUR Sans Fil JBL Tour Pro 3 BEIGE']
+    assert sorted(r['id'] for r in index.suggest('ecout')) == [1, 2]
+    assert index.suggest('our pro') == []
+    assert index.suggest('  ') == []
+
+
+def test_each_product_once_and_limit():
+    index = TitleIndex()
+    index.load([(1, 'jbl jbl jbl'), (2, 'jbl go'), (3, 'jbl flip')])
+    results = index.suggest('jbl')
+    assert sorted(r['id'] for r in results) == [1, 2, 3]
+    assert len(index.suggest('jbl', limit=2)) == 2
+
+
+def test_add_update_remove():
+    index = make_index()
+    index.add(4, 'Souris Logitech M185')
+    assert titles(index.suggest('souris')) == ['Souris Logitech M185']
+    index.add(3, 'Clavier Dell KB216')
+    assert index.suggest('k120') == []
+    assert titles(index.suggest('clavier')) == ['Clavier Dell KB216']
+    index.remove(2)
+    assert index.suggest('tune') == []
+    assert len(index) == 3
+
+
+def test_writes_during_a_build_survive_it():
+    index = make_index()
+    start_seq = index._seq
+    # A rebuild holds the build lock while it reads the table
+    with index._build_lock:
+        index.add(5, 'Casque Sony WH-1000XM5')
+        index.remove(1)
+        # Rows read before those writes
+        index.load([(1, 'ECOUTEUR Sans Fil JBL Tour Pro 3 BEIGE'), (2, 'Écouteurs JBL Tune 520BT')], start_seq)
+    assert titles(index.suggest('casque')) == ['Casque Sony WH-1000XM5']
+    assert index.suggest('jbl tour') == []
+    assert titles(index.suggest('jbl')) == ['Écouteurs JBL Tune 520BT']
+
+
+def test_invalidate_keeps_serving():
+    index = make_index()
+    assert index._is_fresh()
+    index.invalidate()
+    assert not index._is_fresh()
+    assert titles(index.suggest('clavier')) == ['Clavier Logitech K120']
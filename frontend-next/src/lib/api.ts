@@ -1,5 +1,5 @@
 import { jwtDecode } from 'jwt-decode';
-import { Product } from './types';
+import { Product, ProductQuery } from './types';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:5000';
 
@@ -67,8 +67,12 @@ class ProductApi {
     return response.json();
   }
 
-  async getAll(page: number = 1, perPage: number = 10) {
-    return this.fetchWithAuth(`${this.baseUrl}/products?page=${page}&per_page=${perPage}`);
+  async getAll(page: number = 1, perPage: number = 10, query: ProductQuery = {}) {
+    const params = new URLSearchParams({ page: String(page), per_page: String(perPage) });
+    Object.entries(query).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') params.set(key, String(value));
+    });
+    return this.fetchWithAuth(`${this.baseUrl}/products?${params.toString()}`);
   }
 
   async getById(id: string | number) {
@@ -98,6 +102,10 @@ class ProductApi {
   async search(query: string) {
     return this.fetchWithAuth(`${this.baseUrl}/products/search?q=${encodeURIComponent(query)}`);
   }
+
+  async suggest(query: string, limit: number = 10) {
+    return this.fetchWithAuth(`${this.baseUrl}/products/suggest?q=${encodeURIComponent(query)}&limit=${limit}`);
+  }
 }
 
 export const productApi = new ProductApi(API_BASE_URL);
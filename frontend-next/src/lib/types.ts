@@ -4,4 +4,16 @@ export interface Product {
   description?: string;
   price: number;
   category?: string;
-} 
\ No newline at end of file
+} 
+
+export interface ProductQuery {
+  category?: string;
+  min_price?: number;
+  max_price?: number;
+  min_delta_tunisianet?: number;
+  max_delta_tunisianet?: number;
+  min_delta_mytech?: number;
+  max_delta_mytech?: number;
+  sort?: string;
+  facets?: 'category';
+}
@@ -0,0 +1,270 @@
+"""Compact random forest artifacts.
+
+Converts a fitted RandomForestRegressor into flat float32 / int32 node
+arrays (CompactForest), optionally dropping trees and truncating depth as
+long as validation RMSE stays within a tolerance of the full forest.
+
+Two on-disk formats:
+  * 'npy' - a directory of .npy files, loaded with mmap_mode='r' so every
+    worker process shares the same pages instead of unpickling its own copy
+  * 'npz' - a single compressed file, smallest on disk
+
+Pruning and the report use a held-out split of the CSV: the same
+test_size and random_state as ModelTrainer.prepare_data and
+evaluation.compare_models, so a model trained through ModelTrainer has not
+seen those rows and the tolerance applies to validation RMSE, not
+training RMSE.
+
+Usage:
+
+    python -m models.compaction models/trained_model.joblib \\
+        --data models/scraped_data12.csv --out models/trained_model.compact
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+import numpy as np
+import joblib
+
+ARRAY_NAMES = ['left', 'right', 'feature', 'threshold', 'value', 'roots']
+
+
+def _flatten_tree(estimator, max_depth=None):
+    """Return node arrays for one tree, keeping only nodes above max_depth.
+
+    A node at max_depth becomes a leaf; sklearn stores the mean target of
+    internal nodes too, so its value is a valid prediction.
+    """
+    tree = estimator.tree_
+    children_left = tree.children_left
+    children_right = tree.children_right
+
+    # Breadth-first so a kept node always precedes its children
+    order = []
+    new_index = {}
+    queue = deque([(0, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        new_index[node] = len(order)
+        order.append((node, depth))
+        if children_left[node] != -1 and (max_depth is None or depth < max_depth):
+            queue.append((children_left[node], depth + 1))
+            queue.append((children_right[node], depth + 1))
+
+    n_nodes = len(order)
+    left = np.full(n_nodes, -1, dtype=np.int32)
+    right = np.full(n_nodes, -1, dtype=np.int32)
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float32)
+    value = np.empty(n_nodes, dtype=np.float32)
+    for i, (node, _) in enumerate(order):
+        value[i] = tree.value[node, 0, 0]
+        if children_left[node] != -1 and children_left[node] in new_index:
+            left[i] = new_index[children_left[node]]
+            right[i] = new_index[children_right[node]]
+            feature[i] = tree.feature[node]
+            threshold[i] = tree.threshold[node]
+    return left, right, feature, threshold, value
+
+
+class CompactForest:
+    """Mean-of-trees regressor over flat node arrays"""
+
+    def __init__(self, left, right, feature, threshold, value, roots, feature_names=None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.feature_names = list(feature_names) if feature_names is not None else None
+
+    @classmethod
+    def from_forest(cls, forest, n_trees=None, max_depth=None):
+        """Build from a fitted forest, keeping the first `n_trees` trees"""
+        estimators = forest.estimators_[:n_trees] if n_trees else forest.estimators_
+        parts = [_flatten_tree(estimator, max_depth) for estimator in estimators]
+
+        offsets = np.cumsum([0] + [len(part[0]) for part in parts[:-1]])
+        left, right = [], []
+        for (tree_left, tree_right, *_), offset in zip(parts, offsets):
+            # Shift child indices into the concatenated arrays, keep -1 leaves
+            left.append(np.where(tree_left == -1, -1, tree_left + offset).astype(np.int32))
+            right.append(np.where(tree_right == -1, -1, tree_right + offset).astype(np.int32))
+
+        feature_names = getattr(forest, 'feature_names_in_', None)
+        return cls(
+            np.concatenate(left),
+            np.concatenate(right),
+            np.concatenate([part[2] for part in parts]),
+            np.concatenate([part[3] for part in parts]),
+            np.concatenate([part[4] for part in parts]),
+            offsets.astype(np.int32),
+            feature_names
+        )
+
+    @property
+    def n_nodes(self):
+        return len(self.value)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    def _as_matrix(self, X):
+        if hasattr(X, 'columns') and self.feature_names is not None:
+            X = X[self.feature_names]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def predict(self, X):
+        X = self._as_matrix(X)
+        n_rows = X.shape[0]
+        total = np.zeros(n_rows, dtype=np.float64)
+        for root in self.roots:
+            node = np.full(n_rows, root, dtype=np.int32)
+            active = np.arange(n_rows) if self.left[root] != -1 else np.arange(0)
+            # Walk every row down the tree one level at a time
+            while active.size:
+                current = node[active]
+                go_left = X[active, self.feature[current]] <= self.threshold[current]
+                node[active] = np.where(go_left, self.left[current], self.right[current])
+                active = active[self.left[node[active]] != -1]
+            total += self.value[node]
+        return total / len(self.roots)
+
+    def save(self, path, fmt='npy'):
+        """Write the arrays to `path` as an mmap-able directory or an .npz"""
+        arrays = {name: getattr(self, name) for name in ARRAY_NAMES}
+        meta = {'feature_names': self.feature_names}
+        if fmt == 'npz':
+            np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        if os.path.isdir(path):
+            mode = 'r' if mmap else None
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode) for name in ARRAY_NAMES}
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        else:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in ARRAY_NAMES}
+                meta = json.loads(str(data['meta']))
+        return cls(feature_names=meta.get('feature_names'), **arrays)
+
+
+def _rmse(model, X, y):
+    return float(np.sqrt(np.mean((model.predict(X) - y) ** 2)))
+
+
+def prune_forest(forest, X_val, y_val, tolerance=0.01, tree_counts=None, depths=None):
+    """Pick the smallest CompactForest within `tolerance` of the full RMSE.
+
+    Tries every (tree count, depth) pair and returns (compact, info), where
+    info records the chosen configuration and its validation RMSE.
+    """
+    n_estimators = len(forest.estimators_)
+    full_depth = max(estimator.tree_.max_depth for estimator in forest.estimators_)
+    tree_counts = tree_counts or sorted({n_estimators, *(max(1, n_estimators * k // 8) for k in range(1, 8))})
+    depths = depths or sorted({full_depth, *(d for d in (6, 8, 10, 12, 16, 20) if d < full_depth)})
+
+    reference = CompactForest.from_forest(forest)
+    budget = _rmse(reference, X_val, y_val) * (1 + tolerance)
+
+    best, best_info = reference, {'n_trees': n_estimators, 'max_depth': full_depth}
+    for depth in depths:
+        for n_trees in tree_counts:
+            candidate = CompactForest.from_forest(forest, n_trees=n_trees, max_depth=depth)
+            if candidate.n_nodes >= best.n_nodes:
+                continue
+            if _rmse(candidate, X_val, y_val) <= budget:
+                best, best_info = candidate, {'n_trees': n_trees, 'max_depth': depth}
+    best_info['rmse'] = _rmse(best, X_val, y_val)
+    best_info['reference_rmse'] = _rmse(reference, X_val, y_val)
+    return best, best_info
+
+
+def _path_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _latency(model, X, repeats=20):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def compaction_report(forest, forest_path, compact, compact_path, X, y):
+    """Size, latency and accuracy of the original vs the compacted model"""
+    load_start = time.perf_counter()
+    joblib.load(forest_path)
+    forest_load_ms = (time.perf_counter() - load_start) * 1000
+    load_start = time.perf_counter()
+    CompactForest.load(compact_path)
+    compact_load_ms = (time.perf_counter() - load_start) * 1000
+
+    return {
+        'original': {
+            'size_kb': _path_size(forest_path) / 1024,
+            'load_ms': forest_load_ms,
+            'predict_1_row_ms': _latency(forest, X[:1]),
+            'predict_batch_ms': _latency(forest, X),
+            'rmse': _rmse(forest, X, y),
+        },
+        'compact': {
+            'size_kb': _path_size(compact_path) / 1024,
+            'load_ms': compact_load_ms,
+            'predict_1_row_ms': _latency(compact, X[:1]),
+            'predict_batch_ms': _latency(compact, X),
+            'rmse': _rmse(compact, X, y),
+        },
+    }
+
+
+def main(argv=None):
+    from sklearn.model_selection import train_test_split
+    from .evaluation import load_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help="joblib file holding a fitted RandomForestRegressor")
+    parser.add_argument('--data', required=True, help="scraped_data CSV export used for validation")
+    parser.add_argument('--out', required=True, help="output directory (npy) or file (npz)")
+    parser.add_argument('--format', choices=['npy', 'npz'], default='npy')
+    parser.add_argument('--tolerance', type=float, default=0.01, help="allowed relative RMSE increase")
+    parser.add_argument('--test-size', type=float, default=0.2, help="held-out fraction used for validation")
+    parser.add_argument('--no-prune', action='store_true', help="only convert to float32 arrays")
+    args = parser.parse_args(argv)
+
+    forest = joblib.load(args.model)
+    X, y = load_dataset(args.data)
+    _, X_val, _, y_val = train_test_split(X, y, test_size=args.test_size, random_state=42)
+    if args.no_prune:
+        compact, info = CompactForest.from_forest(forest), {}
+    else:
+        compact, info = prune_forest(forest, X_val, y_val, tolerance=args.tolerance)
+    compact.save(args.out, fmt=args.format)
+    out_path = args.out if args.format == 'npy' or args.out.endswith('.npz') else args.out + '.npz'
+
+    report = compaction_report(forest, args.model, compact, out_path, X_val, y_val)
+    report['validation_rows'] = len(y_val)
+    report['pruning'] = info
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
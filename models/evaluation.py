@@ -0,0 +1,141 @@
+"""Compare candidate price models on a scraped_data export.
+
+Reports accuracy (RMSE, R²) next to the costs we pay in production: fit
+time, single-row predict latency (POST /products), batch throughput
+(exports, repricing) and pickled model size.
+
+Usage:
+
+    python -m models.evaluation models/scraped_data12.csv [--json]
+"""
+import sys
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.ensemble import RandomForestRegressor
+from .model_trainer import ModelTrainer
+
+PRICE_COLUMNS = ['price', 'historical_price', 'price_tunisianet', 'price_mytech']
+
+
+def _trainer_model(model_type):
+    return lambda: ModelTrainer(model_type=model_type, load_existing=False).build_model()
+
+
+# name -> factory, so results map onto what we ship today. rf_depth10 is
+# the backend PricePredictor's forest (not importable from here); the
+# others come from ModelTrainer.build_model.
+CANDIDATES = {
+    'rf_depth10': lambda: RandomForestRegressor(
+        n_estimators=100, max_depth=10, min_samples_split=5,
+        min_samples_leaf=2, random_state=42
+    ),
+    'rf_unbounded': _trainer_model('random_forest'),
+    'gradient_boosting': _trainer_model('gradient_boosting'),
+    'hist_gradient_boosting': _trainer_model('hist_gradient_boosting'),
+}
+
+
+def clean_price(value):
+    """Parse price strings such as '1\xa0049,000 DT' into millimes.
+
+    Same as PricePredictor.clean_price, except that plain spaces are dropped
+    too (some exports use them as thousands separators) and non-string
+    values are returned unchanged.
+    """
+    if isinstance(value, str):
+        value = value.replace('DT', '').replace('\xa0', '').replace(' ', '').replace(',', '').strip()
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+    return value
+
+
+def load_dataset(path):
+    """Load a scraped_data CSV export and return (X, y)"""
+    df = pd.read_csv(path)
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_price)
+    df = df.dropna(subset=['price'])
+
+    trainer = ModelTrainer(load_existing=False)
+    X = trainer.preprocess_input(df)
+    return X, df['price'].astype(float).values
+
+
+def _median_latency(predict, row, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def evaluate_candidate(model, X_train, X_test, y_train, y_test, latency_repeats=50):
+    """Fit `model` and return its accuracy and cost metrics"""
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    mse = mean_squared_error(y_test, y_pred)
+    return {
+        'rmse': float(np.sqrt(mse)),
+        'r2': float(r2_score(y_test, y_pred)),
+        'fit_time_s': fit_time,
+        'predict_latency_ms': _median_latency(model.predict, X_test.iloc[:1], latency_repeats) * 1000,
+        'batch_us_per_row': batch_time / len(X_test) * 1e6,
+        'model_size_kb': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024,
+    }
+
+
+def compare_models(X, y, candidates=None, test_size=0.2, latency_repeats=50):
+    """Evaluate every candidate on the same split; returns {name: metrics}"""
+    candidates = candidates or CANDIDATES
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42
+    )
+    return {
+        name: evaluate_candidate(factory(), X_train, X_test, y_train, y_test, latency_repeats)
+        for name, factory in candidates.items()
+    }
+
+
+def format_report(results):
+    header = f"{'model':<24}{'rmse':>12}{'r2':>8}{'fit s':>9}{'1-row ms':>10}{'us/row':>9}{'size kb':>10}"
+    lines = [header, '-' * len(header)]
+    for name, m in results.items():
+        lines.append(
+            f"{name:<24}{m['rmse']:>12.2f}{m['r2']:>8.3f}{m['fit_time_s']:>9.3f}"
+            f"{m['predict_latency_ms']:>10.2f}{m['batch_us_per_row']:>9.1f}{m['model_size_kb']:>10.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data', help="scraped_data CSV export")
+    parser.add_argument('--only', nargs='+', choices=list(CANDIDATES), help="evaluate a subset")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    X, y = load_dataset(args.data)
+    candidates = {name: CANDIDATES[name] for name in args.only} if args.only else CANDIDATES
+    results = compare_models(X, y, candidates)
+    print(json.dumps(results, indent=2) if args.json else format_report(results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
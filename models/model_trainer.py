@@ -6,9 +6,11 @@ import joblib
 import logging
 from datetime import datetime
 from .feature_engineering import FeatureEngineer
+from .parallel_scoring import ParallelScorer
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 import os
+import atexit
 import traceback
 import sys
 
@@ -24,16 +26,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class ModelTrainer:
-    def __init__(self):
+    def __init__(self, model_type='random_forest', load_existing=True):
         logger.info("Initializing ModelTrainer")
         self.model = None
+        self.model_type = model_type
+        self.feature_engineer = FeatureEngineer()
+        self.logger = logger
         self.label_encoders = {}
+        self._scorer = None
         self.features = [
             'historical_price', 'price_tunisianet', 'price_mytech',
             'historical_discount', 'price_diff_competitors',
             'price_ratio_competitors', 'discount_impact', 'category_encoded'
         ]
-        self.load_model()
+        if load_existing:
+            self.load_model()
 
     def _setup_logger(self):
         """Setup logging configuration"""
@@ -76,29 +83,46 @@ class ModelTrainer:
             self.logger.error(f"Error in data preparation: {str(e)}")
             raise
     
+    def build_model(self):
+        """Return an unfitted estimator for self.model_type"""
+        if self.model_type == 'random_forest':
+            from sklearn.ensemble import RandomForestRegressor
+            return RandomForestRegressor(
+                n_estimators=100,
+                max_depth=None,
+                min_samples_split=2,
+                min_samples_leaf=1,
+                random_state=42
+            )
+        elif self.model_type == 'gradient_boosting':
+            from sklearn.ensemble import GradientBoostingRegressor
+            return GradientBoostingRegressor(
+                n_estimators=200,
+                learning_rate=0.05,
+                max_depth=3,
+                random_state=42
+            )
+        elif self.model_type == 'hist_gradient_boosting':
+            from sklearn.ensemble import HistGradientBoostingRegressor
+            return HistGradientBoostingRegressor(
+                max_iter=200,
+                learning_rate=0.05,
+                random_state=42
+            )
+        elif self.model_type == 'xgboost':
+            from xgboost import XGBRegressor
+            return XGBRegressor(
+                n_estimators=100,
+                learning_rate=0.1,
+                max_depth=7,
+                random_state=42
+            )
+        raise ValueError(f"Unsupported model type: {self.model_type}")
+
     def train_model(self, X_train, y_train):
         """Train the model based on the specified model type"""
         try:
-            if self.model_type == 'random_forest':
-                from sklearn.ensemble import RandomForestRegressor
-                self.model = RandomForestRegressor(
-                    n_estimators=100,
-                    max_depth=None,
-                    min_samples_split=2,
-                    min_samples_leaf=1,
-                    random_state=42
-                )
-            elif self.model_type == 'xgboost':
-                from xgboost import XGBRegressor
-                self.model = XGBRegressor(
-                    n_estimators=100,
-                    learning_rate=0.1,
-                    max_depth=7,
-                    random_state=42
-                )
-            else:
-                raise ValueError(f"Unsupported model type: {self.model_type}")
-            
+            self.model = self.build_model()
             self.model.fit(X_train, y_train)
             self.logger.info(f"Model training completed successfully")
             
@@ -246,8 +270,13 @@ class ModelTrainer:
             logger.error(traceback.format_exc())
             raise
 
-    def predict(self, data):
-        """Make predictions using the trained model"""
+    def predict(self, data, workers=None):
+        """Make predictions using the trained model
+
+        Pass workers > 1 to score large frames on a process pool; results
+        are identical to the serial path. The pool is kept for later calls
+        until the model changes or close_scorer() is called.
+        """
         try:
             logger.info("Making predictions")
             if self.model is None:
@@ -258,7 +287,10 @@ class ModelTrainer:
             processed_data = self.preprocess_input(data)
             
             # Make predictions
-            predictions = self.model.predict(processed_data)
+            if workers and workers > 1:
+                predictions = self._get_scorer(workers).predict(processed_data)
+            else:
+                predictions = self.model.predict(processed_data)
             logger.info(f"Raw predictions: {predictions}")
             
             # Apply business rules
@@ -275,10 +307,27 @@ class ModelTrainer:
             logger.error(traceback.format_exc())
             raise
 
+    def _get_scorer(self, workers):
+        scorer = self._scorer
+        if scorer is None or scorer.model is not self.model or scorer.workers != workers:
+            self.close_scorer()
+            scorer = self._scorer = ParallelScorer(self.model, workers=workers)
+            atexit.register(scorer.close)
+        return scorer
+
+    def close_scorer(self):
+        """Stop the scoring pool started by predict(workers > 1), if any"""
+        if self._scorer is not None:
+            self._scorer.close()
+            atexit.unregister(self._scorer.close)
+            self._scorer = None
+
     def train(self, data):
         """Train the model on new data"""
         try:
             logger.info("Training model on new data")
+            # Refitted in place: pooled workers hold the old trees
+            self.close_scorer()
             # Preprocess training data
             processed_data = self.preprocess_input(data)
             
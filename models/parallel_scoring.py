@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import logging
+import numpy as np
+import joblib
+from concurrent.futures import ProcessPoolExecutor
+from .compaction import CompactForest
+
+logger = logging.getLogger(__name__)
+
+SCORING_WORKERS = int(os.getenv('SCORING_WORKERS', str(os.cpu_count() or 1)))
+SCORING_CHUNK_SIZE = int(os.getenv('SCORING_CHUNK_SIZE', '5000'))
+
+# Model loaded once per worker process
+_worker_model = None
+
+
+def _init_worker(model_path, compact):
+    global _worker_model
+    if compact:
+        # Read-only maps of the .npy files: every worker uses the same pages
+        _worker_model = CompactForest.load(model_path, mmap=True)
+        return
+    _worker_model = joblib.load(model_path)
+    if hasattr(_worker_model, 'n_jobs'):
+        _worker_model.n_jobs = 1
+
+
+def _predict_shard(X):
+    return _worker_model.predict(X)
+
+
+class ParallelScorer:
+    """Score large feature frames across a process pool.
+
+    Rows are sharded, not trees: every row is still evaluated by all trees
+    in the same order inside one process, so results are bit-identical to a
+    serial ``model.predict``. Sharding trees would change the order of the
+    floating point sum across trees.
+
+    The model is dumped once when the pool starts and loaded once per
+    worker. An sklearn forest is unpickled into every worker (its trees copy
+    their node arrays on load, so they cannot be memory-mapped); pass a
+    CompactForest to have the workers map one set of .npy files instead.
+
+    Keep one scorer for repeated calls: the pool and the model dump are
+    reused until close(). Use as a context manager, or call close() to stop
+    the pool and remove the temporary model files.
+    """
+
+    def __init__(self, model, workers=SCORING_WORKERS, chunk_size=SCORING_CHUNK_SIZE):
+        self.model = model
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self._pool = None
+        self._model_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _ensure_pool(self):
+        if self._pool is not None:
+            return
+        self._model_dir = tempfile.mkdtemp(prefix='scoring-')
+        compact = isinstance(self.model, CompactForest)
+        if compact:
+            model_path = self._model_dir
+            self.model.save(model_path, fmt='npy')
+        else:
+            model_path = os.path.join(self._model_dir, 'model.joblib')
+            joblib.dump(self.model, model_path)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(model_path, compact)
+        )
+        logger.info(f"Started scoring pool with {self.workers} workers")
+
+    def predict(self, X):
+        """Predict every row of X, in order"""
+        n_rows = len(X)
+        if self.workers == 1 or n_rows <= self.chunk_size:
+            return self.model.predict(X)
+
+        self._ensure_pool()
+        shards = [
+            X.iloc[start:start + self.chunk_size] if hasattr(X, 'iloc') else X[start:start + self.chunk_size]
+            for start in range(0, n_rows, self.chunk_size)
+        ]
+        return np.concatenate(list(self._pool.map(_predict_shard, shards)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._model_dir is not None:
+            shutil.rmtree(self._model_dir, ignore_errors=True)
+            self._model_dir = None
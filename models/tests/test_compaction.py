@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from models.compaction import CompactForest, prune_forest
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 100, size=(400, 3)), columns=['a', 'b', 'c'])
+    y = 3 * X['a'] + np.where(X['b'] > 50, 40, 0) + rng.normal(0, 1, len(X))
+    return X, y.to_numpy()
+
+
+@pytest.fixture(scope='module')
+def forest(data):
+    X, y = data
+    return RandomForestRegressor(n_estimators=12, max_depth=8, random_state=0).fit(X, y)
+
+
+def test_matches_forest(data, forest):
+    X, _ = data
+    compact = CompactForest.from_forest(forest)
+    assert compact.feature_names == ['a', 'b', 'c']
+    assert len(compact.roots) == 12
+    # float32 thresholds, as in sklearn's own trees
+    np.testing.assert_allclose(compact.predict(X), forest.predict(X), rtol=1e-5)
+    # Columns are picked by name
+    np.testing.assert_allclose(compact.predict(X[['c', 'b', 'a']]), forest.predict(X), rtol=1e-5)
+
+
+def test_truncated_forest(data, forest):
+    X, _ = data
+    compact = CompactForest.from_forest(forest, n_trees=4, max_depth=3)
+    assert len(compact.roots) == 4
+    assert compact.n_nodes < CompactForest.from_forest(forest).n_nodes
+    assert compact.predict(X).shape == (len(X),)
+
+
+@pytest.mark.parametrize('fmt, name', [('npy', 'forest.compact'), ('npz', 'forest.npz')])
+def test_save_load_roundtrip(tmp_path, data, forest, fmt, name):
+    X, _ = data
+    compact = CompactForest.from_forest(forest)
+    path = str(tmp_path / name)
+    compact.save(path, fmt=fmt)
+    loaded = CompactForest.load(path)
+    assert loaded.feature_names == compact.feature_names
+    np.testing.assert_array_equal(loaded.predict(X), compact.predict(X))
+
+
+def test_prune_stays_within_tolerance(data, forest):
+    X, y = data
+    compact, info = prune_forest(forest, X, y, tolerance=0.05)
+    assert info['rmse'] <= info['reference_rmse'] * 1.05
+    assert compact.n_nodes <= CompactForest.from_forest(forest).n_nodes